@@ -1,4 +1,4 @@
-from . import protocol, yaesu_cat
+from . import assets, capture, client, keyer, macros, protocol, shared_state, tracing, yaesu_cat
 
-__all__ = ["protocol", "yaesu_cat"]
+__all__ = ["assets", "capture", "client", "keyer", "macros", "protocol", "shared_state", "tracing", "yaesu_cat"]
 
@@ -0,0 +1,96 @@
+"""Static UI files loaded once at startup, fingerprinted and pre-compressed.
+
+``load_assets()`` reads every file in a directory and keeps, per file, the raw
+bytes plus a gzip encoding (and a brotli one when the optional ``brotli``
+package is installed), each with its own strong ETag.  Nothing is rendered or
+compressed per request.
+
+HTML files have their ``/static/<name>`` references rewritten to
+``/static/<name>?v=<digest>``, so the page itself only needs revalidating while
+the files it references can be cached for good: a new build changes the URL.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Set, Tuple
+
+try:
+    import brotli  # type: ignore
+except ImportError:
+    brotli = None
+
+# preferred order when the client accepts several
+ENCODINGS = ("br", "gzip")
+_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+class Asset:
+    """One static file: ``variants`` maps content coding -> (body, ETag)."""
+
+    __slots__ = ("name", "mimetype", "digest", "variants")
+
+    def __init__(self, name: str, data: bytes):
+        self.name = name
+        self.mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        self.digest = hashlib.sha256(data).hexdigest()[:16]
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (data, self._etag("identity"))}
+        # mtime=0 keeps the gzip bytes (and so the ETag) identical across restarts
+        encoded = {"gzip": gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            encoded["br"] = brotli.compress(data, quality=11)
+        for coding, body in encoded.items():
+            # tiny files can grow when compressed
+            if len(body) < len(data):
+                self.variants[coding] = (body, self._etag(coding))
+
+    def _etag(self, coding: str) -> str:
+        return f'"{self.digest}{_SUFFIX[coding]}"'
+
+    def select(self, accept_encoding: str) -> Tuple[str, bytes, str]:
+        """Return (content coding, body, ETag) for an Accept-Encoding header."""
+        accepted = accepted_encodings(accept_encoding)
+        for coding in ENCODINGS:
+            if coding in self.variants and (coding in accepted or "*" in accepted):
+                return (coding,) + self.variants[coding]
+        return ("identity",) + self.variants["identity"]
+
+
+def accepted_encodings(header: str) -> Set[str]:
+    """Content codings in an Accept-Encoding header, leaving out any with q=0."""
+    accepted = set()
+    for part in (header or "").split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding and q > 0:
+            accepted.add(coding)
+    return accepted
+
+
+def load_assets(directory: str, url_prefix: str = "/static/") -> Dict[str, Asset]:
+    """Load every file in ``directory``; HTML references to the others get ``?v=<digest>``."""
+    if not os.path.isdir(directory):
+        return {}
+    raw = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as f:
+                raw[name] = f.read()
+
+    assets = {name: Asset(name, data) for name, data in raw.items() if not name.endswith(".html")}
+    for name, data in raw.items():
+        if name.endswith(".html"):
+            for ref, asset in assets.items():
+                url = (url_prefix + ref).encode("utf-8")
+                data = data.replace(b'"' + url + b'"', b'"' + url + b"?v=" + asset.digest.encode("ascii") + b'"')
+            assets[name] = Asset(name, data)
+    return assets
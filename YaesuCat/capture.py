@@ -0,0 +1,273 @@
+"""Record and replay the raw byte stream between the app and the rig.
+
+A capture file is a 16-byte header followed by fixed 7-byte record headers and
+the payload bytes::
+
+    header:  b"YCAP" | u8 version | 3 pad bytes | f64 wall-clock start (epoch s)
+    record:  u32 microseconds since previous record | u8 direction | u16 length | payload
+
+``CaptureSerial`` wraps any serial-like object and appends a record for every
+``write()`` (TX), every non-empty read (RX) and every byte that
+``reset_input_buffer()`` is about to discard (DROPPED: late answers and
+unsolicited frames nobody read).  ``ReplaySerial`` plays a file
+back as a serial-like object: RX chunks are released once the reader has
+written as many bytes as preceded them in the capture, optionally also honouring
+the recorded timing (``speed=1.0``) or as fast as possible (``speed=0``).
+
+Dump a capture with ``python -m YaesuCat.capture <file>``.
+"""
+
+import struct
+import sys
+import threading
+import time
+from typing import BinaryIO, Iterator, List, Optional, Tuple, Union
+
+MAGIC = b"YCAP"
+VERSION = 1
+TX = 0
+RX = 1
+# received but thrown away by reset_input_buffer(); the app never saw these
+DROPPED = 2
+_NAMES = {TX: "TX", RX: "RX", DROPPED: "DROPPED"}
+
+_HEADER = struct.Struct("<4sB3xd")
+_RECORD = struct.Struct("<IBH")
+_MAX_DELTA_US = 0xFFFFFFFF
+_MAX_CHUNK = 0xFFFF
+
+
+class CaptureWriter:
+    """Append timestamped TX/RX chunks to a capture file; safe across threads."""
+
+    def __init__(self, path: str, buffering: int = 64 * 1024):
+        self._f: BinaryIO = open(path, "wb", buffering=buffering)
+        self._lock = threading.Lock()
+        self._last = time.perf_counter()
+        self._f.write(_HEADER.pack(MAGIC, VERSION, time.time()))
+
+    def record(self, direction: int, data: bytes) -> None:
+        if not data:
+            return
+        with self._lock:
+            now = time.perf_counter()
+            delta = min(_MAX_DELTA_US, int((now - self._last) * 1_000_000))
+            self._last = now
+            f = self._f
+            for i in range(0, len(data), _MAX_CHUNK):
+                chunk = data[i:i + _MAX_CHUNK]
+                f.write(_RECORD.pack(delta, direction, len(chunk)))
+                f.write(chunk)
+                delta = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._f.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if not self._f.closed:
+                self._f.close()
+
+
+def iter_capture(path_or_file: Union[str, BinaryIO]) -> Iterator[Tuple[float, int, bytes]]:
+    """Yield ``(seconds_since_start, direction, data)`` for every record."""
+    f = open(path_or_file, "rb") if isinstance(path_or_file, str) else path_or_file
+    try:
+        head = f.read(_HEADER.size)
+        if len(head) < _HEADER.size:
+            raise ValueError("not a capture file (truncated header)")
+        magic, version, _start = _HEADER.unpack(head)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a capture file (magic={magic!r}, version={version})")
+        t_us = 0
+        while True:
+            rec = f.read(_RECORD.size)
+            if len(rec) < _RECORD.size:
+                return
+            delta, direction, length = _RECORD.unpack(rec)
+            data = f.read(length)
+            if len(data) < length:
+                # capture cut short (e.g. process killed); keep what is complete
+                return
+            t_us += delta
+            yield t_us / 1_000_000, direction, data
+    finally:
+        if isinstance(path_or_file, str):
+            f.close()
+
+
+class CaptureSerial:
+    """Serial wrapper that records traffic; every other attribute is passed through."""
+
+    def __init__(self, wrapped, writer: CaptureWriter):
+        self._wrapped = wrapped
+        self._writer = writer
+
+    def __getattr__(self, name):
+        return getattr(self._wrapped, name)
+
+    def write(self, data):
+        n = self._wrapped.write(data)
+        self._writer.record(TX, bytes(data))
+        return n
+
+    def read(self, size=1):
+        data = self._wrapped.read(size)
+        self._writer.record(RX, data)
+        return data
+
+    def read_until(self, *args, **kwargs):
+        data = self._wrapped.read_until(*args, **kwargs)
+        self._writer.record(RX, data)
+        return data
+
+    def readline(self, *args, **kwargs):
+        data = self._wrapped.readline(*args, **kwargs)
+        self._writer.record(RX, data)
+        return data
+
+    def reset_input_buffer(self):
+        # CatClient flushes before every batch; keep what it is about to throw away
+        waiting = getattr(self._wrapped, "in_waiting", 0)
+        if waiting:
+            self._writer.record(DROPPED, self._wrapped.read(waiting))
+        self._wrapped.reset_input_buffer()
+
+    def close(self):
+        self._writer.flush()
+        self._wrapped.close()
+
+
+class ReplaySerial:
+    """Serial-like transport that plays back the RX side of a capture.
+
+    Each RX chunk is gated on the number of TX bytes that preceded it in the
+    capture, so the replay stays in step with whatever the caller writes even if
+    it batches commands differently.  With ``speed > 0`` a chunk is also held
+    back until its recorded delay after the gating write has elapsed (scaled by
+    ``speed``); ``speed=0`` replays as fast as possible.  Reads block for at most
+    ``timeout`` seconds, like ``serial.Serial``.  ``exhausted`` becomes True once
+    every RX chunk has been consumed.
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, timeout: Optional[float] = 0.15):
+        self.speed = speed
+        self.timeout = timeout
+        self.is_open = True
+        self.writes: List[bytes] = []
+        # (tx bytes needed, delay after the gating write in seconds, data)
+        self._chunks: List[Tuple[int, float, bytes]] = []
+        tx_bytes = 0
+        last_tx_t = 0.0
+        for t, direction, data in iter_capture(path):
+            if direction == TX:
+                tx_bytes += len(data)
+                last_tx_t = t
+            elif direction == RX:
+                # DROPPED bytes were flushed unread, so the app must not see them here either
+                self._chunks.append((tx_bytes, t - last_tx_t, data))
+        self._next = 0
+        self._buf = b""
+        self._written = 0
+        # monotonic time at which the written byte count reached each threshold
+        self._gate_times = {0: time.monotonic()}
+        self._cond = threading.Condition()
+
+    @property
+    def exhausted(self) -> bool:
+        return self._next >= len(self._chunks) and not self._buf
+
+    def write(self, data):
+        data = bytes(data)
+        with self._cond:
+            self.writes.append(data)
+            before = self._written
+            self._written += len(data)
+            now = time.monotonic()
+            for need, _delay, _data in self._chunks[self._next:]:
+                if need > self._written:
+                    break
+                if need > before:
+                    self._gate_times.setdefault(need, now)
+            self._cond.notify_all()
+        return len(data)
+
+    def _release_at(self, need: int, delay: float) -> Optional[float]:
+        gate = self._gate_times.get(need)
+        if gate is None:
+            return None
+        return gate + (delay / self.speed if self.speed > 0 else 0.0)
+
+    def _fill(self, deadline: Optional[float]) -> bool:
+        """Move the next RX chunk into the buffer, waiting until ``deadline``."""
+        with self._cond:
+            while self._next < len(self._chunks):
+                need, delay, data = self._chunks[self._next]
+                now = time.monotonic()
+                at = self._release_at(need, delay)
+                if at is not None and at <= now:
+                    self._buf += data
+                    self._next += 1
+                    return True
+                if deadline is not None and now >= deadline:
+                    return False
+                wait = None if deadline is None else deadline - now
+                if at is not None:
+                    wait = at - now if wait is None else min(wait, at - now)
+                elif self.speed <= 0:
+                    # as fast as possible: nothing more will come until the caller writes
+                    return False
+                self._cond.wait(wait)
+        return False
+
+    def _deadline(self) -> Optional[float]:
+        return None if self.timeout is None else time.monotonic() + self.timeout
+
+    def read(self, size=1):
+        deadline = self._deadline()
+        while len(self._buf) < size and self._fill(deadline):
+            pass
+        out, self._buf = self._buf[:size], self._buf[size:]
+        return out
+
+    def read_until(self, expected=b"\n", size=None):
+        deadline = self._deadline()
+        while True:
+            i = self._buf.find(expected)
+            if i >= 0:
+                end = i + len(expected)
+                if size is not None:
+                    end = min(end, size)
+                out, self._buf = self._buf[:end], self._buf[end:]
+                return out
+            if size is not None and len(self._buf) >= size:
+                break
+            if not self._fill(deadline):
+                break
+        out, self._buf = (self._buf, b"") if size is None else (self._buf[:size], self._buf[size:])
+        return out
+
+    def readline(self, size=None):
+        return self.read_until(b"\n", size)
+
+    def reset_input_buffer(self):
+        # a live port would drop unread bytes; the capture already shows what was read
+        pass
+
+    def flushInput(self):
+        self.reset_input_buffer()
+
+    def close(self):
+        self.is_open = False
+
+
+def _dump(path: str) -> None:
+    for t, direction, data in iter_capture(path):
+        print(f"{t:12.6f} {_NAMES.get(direction, direction)} {data!r}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        raise SystemExit("usage: python -m YaesuCat.capture <capture-file>")
+    _dump(sys.argv[1])
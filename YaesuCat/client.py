@@ -0,0 +1,368 @@
+"""Queue-based CAT client that shares one serial port between many callers.
+
+Callers never touch the serial lock themselves: ``query()`` and ``send()``
+enqueue a request and return a ``concurrent.futures.Future``.  A single worker
+thread drains the queue, writes queued commands in one burst and hands every
+answer frame to the oldest pending request with the same two-letter mnemonic.
+A rejection (``?;``) goes to the oldest command still outstanding, set commands
+included: a set is only taken as accepted once the rig has answered a command
+written after it, or ``reject_window`` has passed without a ``?;``.
+
+Example:
+
+    cat = CatClient(lambda: ser, serial_lock)
+    hz = parse_freq_response(cat.query(b"FA;").result())
+    # or, from asyncio code
+    raw = await cat.aquery(b"FB;")
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from .tracing import Trace, add_span
+
+logger = logging.getLogger(__name__)
+
+Command = Union[bytes, bytearray, str]
+
+# read the rig always answers; marks the end of a set in send_then_query()
+SEPARATOR = b"ID;"
+
+
+class CatError(Exception):
+    """The rig rejected a command (``?;``) or the port is unavailable."""
+
+
+class CatTimeout(CatError, TimeoutError):
+    """No matching answer arrived before the request's deadline."""
+
+
+def _to_bytes(cmd: Command) -> bytes:
+    if isinstance(cmd, str):
+        cmd = cmd.encode("ascii")
+    cmd = bytes(cmd)
+    if not cmd.endswith(b";"):
+        cmd += b";"
+    return cmd
+
+
+def frame_mnemonic(frame: bytes) -> bytes:
+    """Return the two-letter mnemonic of a CAT frame (b"" if there is none).
+
+    Leading non-letter bytes (line noise, stray control characters) are skipped,
+    so ``b"\\x10FB007100000;"`` yields ``b"FB"``.  A rejected command answers
+    ``?;`` which yields ``b"?"``.
+    """
+    i = 0
+    n = len(frame)
+    while i < n and not (65 <= frame[i] <= 90 or frame[i] == 63):
+        i += 1
+    if i < n and frame[i] == 63:
+        return b"?"
+    return bytes(frame[i:i + 2]) if i + 2 <= n else b""
+
+
+def read_frame(s) -> bytes:
+    """Read until b';' if available, else fall back to readline()."""
+    if hasattr(s, "read_until"):
+        return s.read_until(b";")
+    return s.readline()
+
+
+class _Request:
+    __slots__ = ("cmd", "mnemonic", "expect_answer", "timeout", "retries", "future", "deadline", "started",
+                 "trace", "queued", "frames", "rejected")
+
+    def __init__(self, cmd: bytes, expect_answer: bool, timeout: float, retries: int,
+                 trace: Optional[Trace] = None):
+        self.cmd = cmd
+        self.mnemonic = frame_mnemonic(cmd)
+        self.expect_answer = expect_answer
+        self.timeout = timeout
+        self.retries = retries
+        self.future: Future = Future()
+        self.deadline = 0.0
+        self.started = False
+        self.trace = trace
+        self.queued = time.perf_counter() if trace is not None else 0.0
+        # a set may carry several commands (a macro payload); each can be rejected
+        self.frames = max(1, cmd.count(b";"))
+        self.rejected: List[bytes] = []
+
+    def claim(self) -> bool:
+        """Mark the future running; False if the caller cancelled it meanwhile."""
+        if self.started:
+            return True
+        self.started = True
+        return self.future.set_running_or_notify_cancel()
+
+
+class CatClient:
+    """Serialise CAT traffic from many threads onto one serial port.
+
+    ``get_serial`` is called for every batch so the client follows the caller's
+    reconnect logic (``main.ser`` is rebound by ``open_serial()``).  ``lock`` is
+    held for the duration of each batch so code that still talks to the port
+    directly stays safe.  ``timeouts`` maps a mnemonic (e.g. ``"ID"``) to a
+    per-command answer timeout in seconds; others use ``timeout``.
+    ``reject_window`` is how long a set command with nothing written after it
+    waits for a possible ``?;`` before its future resolves.
+
+    A ``?;`` carries no mnemonic, so it is charged to the oldest outstanding
+    command.  An accepted set stays outstanding until a later command is
+    answered, so when the read right after it is rejected the set would be
+    blamed.  ``send_then_query()`` avoids this by writing ``ID;`` (which the
+    rig always answers) between the set and its reads; a plain ``send()`` that
+    shares a batch with other callers' reads can still be misattributed.
+
+    Requests may carry a ``Trace`` (see ``YaesuCat.tracing``); the batch that
+    sends them then records queue, lock, write, turnaround and read spans into it.
+
+    Answer frames that match no pending request (e.g. ``AI`` auto-information
+    reports) are passed to ``on_unsolicited`` when given.  ``on_io_error`` is
+    called with the exception when a write or read on the port fails, so the
+    owner can drop the port and reconnect.
+    """
+
+    def __init__(
+        self,
+        get_serial: Callable[[], object],
+        lock: Optional[threading.Lock] = None,
+        timeout: float = 0.5,
+        retries: int = 1,
+        timeouts: Optional[Dict[str, float]] = None,
+        max_batch: int = 8,
+        on_unsolicited: Optional[Callable[[bytes], None]] = None,
+        on_io_error: Optional[Callable[[Exception], None]] = None,
+        reject_window: float = 0.1,
+    ):
+        self._get_serial = get_serial
+        self._lock = lock if lock is not None else threading.Lock()
+        self.timeout = timeout
+        self.retries = retries
+        self.timeouts = dict(timeouts or {})
+        self.max_batch = max_batch
+        self.on_unsolicited = on_unsolicited
+        self.on_io_error = on_io_error
+        self.reject_window = reject_window
+        self._queue: "queue.Queue[Optional[List[_Request]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    # -- public API -------------------------------------------------------
+
+    def query(self, cmd: Command, timeout: Optional[float] = None, retries: Optional[int] = None,
+              trace: Optional[Trace] = None) -> Future:
+        """Send a read command; the future resolves to the raw answer frame."""
+        return self._submit([self._make(cmd, True, timeout, retries, trace)])[0]
+
+    def send(self, cmd: Command, trace: Optional[Trace] = None) -> Future:
+        """Send a set command; resolves to None once accepted, CatError if the rig rejects it."""
+        return self._submit([self._make(cmd, False, self.reject_window, 0, trace)])[0]
+
+    def query_many(self, cmds: Iterable[Command], timeout: Optional[float] = None,
+                   trace: Optional[Trace] = None) -> List[Future]:
+        """Queue several read commands so they go out in a single write."""
+        return self._submit([self._make(c, True, timeout, None, trace) for c in cmds])
+
+    def send_then_query(self, cmd: Command, reads: Iterable[Command], timeout: Optional[float] = None,
+                        trace: Optional[Trace] = None) -> List[Future]:
+        """Queue a set command and the reads that check it as one write.
+
+        Returns the send future followed by one future per read.  An ``ID;``
+        written after the set separates a rejection of the set from one of
+        the reads: a ``?;`` before the ID answer is the set's.
+        """
+        reqs = [self._make(cmd, False, self.reject_window, 0, trace), self._make(SEPARATOR, True, timeout, 0, trace)]
+        reqs.extend(self._make(c, True, timeout, None, trace) for c in reads)
+        futures = self._submit(reqs)
+        return futures[:1] + futures[2:]
+
+    async def aquery(self, cmd: Command, timeout: Optional[float] = None, retries: Optional[int] = None) -> bytes:
+        """``await``-able form of ``query()``."""
+        return await asyncio.wrap_future(self.query(cmd, timeout, retries))
+
+    def close(self) -> None:
+        """Stop the worker; queued requests that were not sent fail with CatError."""
+        self._closed = True
+        self._queue.put(None)
+
+    # -- internals --------------------------------------------------------
+
+    def _make(self, cmd: Command, expect_answer: bool, timeout: Optional[float], retries: Optional[int],
+              trace: Optional[Trace]) -> _Request:
+        data = _to_bytes(cmd)
+        if timeout is None:
+            timeout = self.timeouts.get(frame_mnemonic(data).decode("ascii", "ignore"), self.timeout)
+        return _Request(data, expect_answer, timeout, self.retries if retries is None else retries, trace)
+
+    def _submit(self, reqs: List[_Request]) -> List[Future]:
+        if self._closed:
+            raise CatError("client closed")
+        self._ensure_worker()
+        self._queue.put(reqs)
+        return [r.future for r in reqs]
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cat-client", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [r for r in item if r.claim()]
+            # opportunistically pick up whatever else is already waiting
+            while len(batch) < self.max_batch:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._queue.put(None)
+                    break
+                batch.extend(r for r in more if r.claim())
+            if batch:
+                self._run_batch(batch)
+        # drain anything left behind after close()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            for r in item or ():
+                if r.claim():
+                    r.future.set_exception(CatError("client closed"))
+
+    def _run_batch(self, batch: List[_Request]) -> None:
+        retry: List[_Request] = []
+        # distinct traces riding on this batch; empty (and free) when tracing is off
+        traces = list({id(r.trace): r.trace for r in batch if r.trace is not None}.values())
+        t_lock = time.perf_counter() if traces else 0.0
+        with self._lock:
+            if traces:
+                t_write = time.perf_counter()
+                for r in batch:
+                    add_span(r.trace, "cat.queue", r.queued, t_lock)
+                for tr in traces:
+                    tr.add("serial_lock.wait", t_lock, t_write)
+            s = self._get_serial()
+            if s is None:
+                for r in batch:
+                    r.future.set_exception(CatError("serial unavailable"))
+                return
+            try:
+                if hasattr(s, "reset_input_buffer"):
+                    s.reset_input_buffer()
+                s.write(b"".join(r.cmd for r in batch))
+            except Exception as e:
+                self._io_error(e)
+                for r in batch:
+                    r.future.set_exception(e)
+                return
+            if traces:
+                t_read = time.perf_counter()
+                for tr in traces:
+                    tr.add("serial.write", t_write, t_read)
+
+            # every command in write order, sets included, so a ?; lands on the right one
+            now = time.monotonic()
+            pending: List[_Request] = list(batch)
+            latest = now
+            for r in batch:
+                r.deadline = now + r.timeout
+                if not r.expect_answer:
+                    # an earlier read still outstanding may delay the set's ?;
+                    r.deadline = max(r.deadline, latest)
+                latest = max(latest, r.deadline)
+
+            first = True
+            while pending:
+                try:
+                    raw = read_frame(s)
+                except Exception as e:
+                    self._io_error(e)
+                    for r in pending:
+                        r.future.set_exception(e)
+                    return
+                if raw:
+                    if traces:
+                        # the first frame's wait is dominated by the rig's turnaround
+                        t_end = time.perf_counter()
+                        for tr in traces:
+                            tr.add("rig.turnaround" if first else "read_until", t_read, t_end)
+                        t_read = t_end
+                        first = False
+                    self._dispatch(raw, pending)
+                now = time.monotonic()
+                for r in [r for r in pending if now >= r.deadline]:
+                    pending.remove(r)
+                    if not r.expect_answer:
+                        self._finish_set(r)
+                    elif r.retries > 0:
+                        r.retries -= 1
+                        retry.append(r)
+                    else:
+                        r.future.set_exception(CatTimeout(f"no answer to {r.cmd!r} within {r.timeout:.3f}s"))
+        if retry:
+            # requeue rather than resend so requests queued meanwhile get a turn
+            self._queue.put(retry)
+
+    def _io_error(self, e: Exception) -> None:
+        if self.on_io_error is not None:
+            try:
+                self.on_io_error(e)
+            except Exception:
+                logger.exception("on_io_error handler failed")
+
+    @staticmethod
+    def _finish_set(r: _Request) -> None:
+        if r.rejected:
+            r.future.set_exception(CatError(f"rig rejected {r.cmd!r}"))
+        else:
+            r.future.set_result(None)
+
+    def _dispatch(self, raw: bytes, pending: List[_Request]) -> None:
+        mn = frame_mnemonic(raw)
+        if mn == b"?":
+            # the rig answers commands in order, so the rejection belongs to the oldest one
+            if not pending:
+                logger.debug("rejection with no command outstanding")
+                return
+            r = pending[0]
+            if r.expect_answer:
+                pending.pop(0)
+                r.future.set_exception(CatError(f"rig rejected {r.cmd!r}"))
+                return
+            r.rejected.append(raw)
+            if len(r.rejected) >= r.frames:
+                pending.pop(0)
+                self._finish_set(r)
+            return
+        for i, r in enumerate(pending):
+            if r.expect_answer and r.mnemonic == mn:
+                # answered in order: no ?; can still come for a set written before this read
+                for earlier in pending[:i]:
+                    if not earlier.expect_answer:
+                        pending.remove(earlier)
+                        self._finish_set(earlier)
+                pending.remove(r)
+                r.future.set_result(raw)
+                return
+        logger.debug("unsolicited CAT frame %r", raw)
+        if self.on_unsolicited is not None:
+            try:
+                self.on_unsolicited(raw)
+            except Exception:
+                logger.exception("on_unsolicited handler failed")
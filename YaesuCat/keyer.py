@@ -0,0 +1,266 @@
+"""Send free text as CW through the rig's keyer memories.
+
+The FTDX101 has no "send this text" command.  Text is loaded into a keyer
+memory with ``KM<ch><text>;`` (at most 50 characters) and played with
+``KY<ch>;``.  ``CwSender`` splits a message into memory-sized chunks at word
+boundaries and alternates between two memory channels: while one chunk is being
+keyed the next is already loaded into the other channel, so only the short
+``KY`` has to wait for the rig to finish.  The rig is considered ready for the
+next chunk once the expected keying time has nearly elapsed and ``TX;``
+reports it back in receive.
+
+All traffic goes through a ``CatClient``, so polling keeps running in between.
+Note that the two memory channels used (4 and 5 by default) are overwritten.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from .client import CatClient, CatError
+from .protocol import build_command
+
+logger = logging.getLogger(__name__)
+
+KEYER_MEMORY_CHARS = 50
+
+# dot = 1 unit, dash = 3 units; used for the character set and timing estimates
+MORSE = {
+    "A": ".-", "B": "-...", "C": "-.-.", "D": "-..", "E": ".", "F": "..-.",
+    "G": "--.", "H": "....", "I": "..", "J": ".---", "K": "-.-", "L": ".-..",
+    "M": "--", "N": "-.", "O": "---", "P": ".--.", "Q": "--.-", "R": ".-.",
+    "S": "...", "T": "-", "U": "..-", "V": "...-", "W": ".--", "X": "-..-",
+    "Y": "-.--", "Z": "--..",
+    "0": "-----", "1": ".----", "2": "..---", "3": "...--", "4": "....-",
+    "5": ".....", "6": "-....", "7": "--...", "8": "---..", "9": "----.",
+    ".": ".-.-.-", ",": "--..--", "?": "..--..", "/": "-..-.", "=": "-...-",
+    "+": ".-.-.", "-": "-....-", "(": "-.--.", ")": "-.--.-", ":": "---...",
+    "'": ".----.", "\"": ".-..-.", "@": ".--.-.",
+}
+
+
+def normalize_cw_text(text: str) -> str:
+    """Uppercase, collapse whitespace and drop characters the keyer cannot send."""
+    words = []
+    for word in text.upper().split():
+        word = "".join(c for c in word if c in MORSE)
+        if word:
+            words.append(word)
+    return " ".join(words)
+
+
+def split_cw_text(text: str, max_len: int = KEYER_MEMORY_CHARS) -> List[str]:
+    """Split text into keyer-memory chunks, breaking at spaces where possible.
+
+    Each chunk except the last keeps its trailing word space so the gap between
+    words survives the hand-over from one memory to the next.
+    """
+    chunks: List[str] = []
+    cur = ""
+    for word in normalize_cw_text(text).split(" "):
+        if not word:
+            continue
+        while len(word) > max_len:
+            if cur:
+                chunks.append(cur)
+                cur = ""
+            chunks.append(word[:max_len])
+            word = word[max_len:]
+        candidate = f"{cur} {word}" if cur else word
+        if len(candidate) <= max_len:
+            cur = candidate
+        else:
+            chunks.append(cur + " " if len(cur) < max_len else cur)
+            cur = word
+    if cur:
+        chunks.append(cur)
+    return chunks
+
+
+def cw_units(text: str) -> int:
+    """Length of ``text`` in CW units (PARIS timing)."""
+    units = 0
+    for i, word in enumerate(text.split()):
+        if i:
+            units += 7
+        for j, c in enumerate(word):
+            code = MORSE.get(c)
+            if code is None:
+                continue
+            if j:
+                units += 3
+            units += sum(1 if s == "." else 3 for s in code) + len(code) - 1
+    if text.endswith(" "):
+        units += 7
+    return units
+
+
+def cw_seconds(text: str, wpm: int) -> float:
+    """Keying time of ``text`` at ``wpm`` words per minute (1 unit = 1.2 / wpm s)."""
+    return cw_units(text) * 1.2 / max(1, wpm)
+
+
+class CwSender:
+    """Paced, abortable CW message queue on top of a ``CatClient``.
+
+    ``send(text)`` returns at once; a background thread loads and plays the
+    chunks.  ``abort()`` drops everything queued and unkeys the rig.
+    """
+
+    def __init__(
+        self,
+        cat: CatClient,
+        channels: Tuple[int, int] = (4, 5),
+        default_wpm: int = 20,
+        poll_interval: float = 0.05,
+        max_chars: int = KEYER_MEMORY_CHARS,
+    ):
+        self.cat = cat
+        self.channels = channels
+        self.max_chars = max_chars
+        self.default_wpm = default_wpm
+        self.poll_interval = poll_interval
+        self._queue: "queue.Queue[Tuple[int, str]]" = queue.Queue()
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+        self._job = 0
+        self._sending: Optional[str] = None
+        # first chunk of a newer message, taken off the queue while finishing the old one
+        self._held: Optional[Tuple[int, str]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def send(self, text: str) -> List[str]:
+        """Queue ``text``; returns the chunks that will be keyed (empty if nothing sendable)."""
+        chunks = split_cw_text(text, self.max_chars)
+        if not chunks:
+            return []
+        with self._lock:
+            job = self._job
+            # under the lock, so a concurrent abort() drains all of these or none
+            for chunk in chunks:
+                self._queue.put((job, chunk))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="cw-sender", daemon=True)
+                self._thread.start()
+        return chunks
+
+    def abort(self) -> int:
+        """Stop keying now; returns the number of queued chunks dropped."""
+        with self._lock:
+            # chunks tagged with an older job number are skipped by the worker
+            self._job += 1
+            self._abort.set()
+            dropped = 1 if self._held is not None else 0
+            self._held = None
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    break
+        try:
+            self.cat.send(build_command("TX", "0"))
+        except CatError:
+            logger.warning("CW abort: could not unkey the rig")
+        return dropped
+
+    def status(self) -> dict:
+        queued = self._queue.qsize() + (self._held is not None)
+        return {"busy": self._sending is not None, "sending": self._sending, "queued": queued}
+
+    # -- worker -----------------------------------------------------------
+
+    def _read_wpm(self) -> int:
+        try:
+            raw = self.cat.query(build_command("KS")).result()
+            return int(raw.strip(b";")[2:5])
+        except (CatError, ValueError):
+            return self.default_wpm
+
+    def _is_transmitting(self) -> Optional[bool]:
+        try:
+            raw = self.cat.query(build_command("TX")).result()
+            return raw.strip(b";")[2:3] != b"0"
+        except CatError:
+            return None
+
+    def _wait_done(self, text: str, wpm: int) -> None:
+        estimate = cw_seconds(text, wpm)
+        # don't ask before the rig can plausibly be done: it may not have keyed yet
+        if self._abort.wait(estimate * 0.8):
+            return
+        deadline = time.monotonic() + estimate * 0.5 + 2.0
+        while time.monotonic() < deadline:
+            tx = self._is_transmitting()
+            if tx is None:
+                # rig not answering TX; fall back to the timing estimate alone
+                self._abort.wait(estimate * 0.2)
+                return
+            if not tx:
+                return
+            if self._abort.wait(self.poll_interval):
+                return
+
+    def _next_chunk(self, block: bool, job: Optional[int] = None) -> Optional[Tuple[int, str]]:
+        """Next chunk of the current job; with ``job``, only one that belongs to it.
+
+        A chunk of a newer job is held back for the outer loop rather than
+        returned, so a message sent right after an abort is not lost.
+        """
+        while True:
+            with self._lock:
+                item, self._held = self._held, None
+            if item is None:
+                try:
+                    item = self._queue.get(block=block)
+                except queue.Empty:
+                    return None
+            if item[0] != self._job:
+                continue
+            if job is not None and item[0] != job:
+                with self._lock:
+                    if item[0] == self._job:
+                        self._held = item
+                return None
+            return item
+
+    def _load(self, channel: int, chunk: str):
+        return self.cat.send(build_command("KM", f"{channel}{chunk}"))
+
+    def _run(self) -> None:
+        while True:
+            job, chunk = self._next_chunk(block=True)
+            with self._lock:
+                if job != self._job:
+                    continue
+                self._abort.clear()
+            wpm = self._read_wpm()
+            slot = 0
+            loaded = self._load(self.channels[slot], chunk)
+            try:
+                while chunk is not None and not self._abort.is_set():
+                    channel = self.channels[slot]
+                    loaded.result()
+                    with self._lock:
+                        # an abort during the load has already queued TX0; KY would key the rig again
+                        if self._abort.is_set() or job != self._job:
+                            break
+                        self._sending = chunk
+                        # queued under the lock, so a later abort's TX0 goes out after it
+                        keyed = self.cat.send(build_command("KY", str(channel)))
+                    keyed.result()
+                    # preload the next chunk into the other memory while this one plays
+                    nxt = self._next_chunk(block=False, job=job)
+                    if nxt is not None:
+                        slot ^= 1
+                        loaded = self._load(self.channels[slot], nxt[1])
+                    self._wait_done(chunk, wpm)
+                    chunk = nxt[1] if nxt is not None else None
+            except Exception:
+                logger.exception("CW sender failed; dropping the rest of the message")
+                with self._lock:
+                    self._job += 1
+            finally:
+                self._sending = None
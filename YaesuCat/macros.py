@@ -0,0 +1,161 @@
+"""Named multi-command rig setups compiled ahead of time into one write.
+
+A macro is a list of set commands, each either a string (mnemonic plus
+parameters, e.g. ``"MD02"``) or a one-key dict (``{"FA": 14074000}``; an
+integer is taken as Hz for FA/FB)::
+
+    {"ft8-20m": ["FA014074000", "MD0C", {"PC": "050"}, "AN01"]}
+
+``compile_macros()`` (used by main.py to load ``macros.json``) checks every
+step against the parameter layout and value range in mainCat.txt.  Only commands listed in ``SET_SPECS`` are
+allowed: a read-only or unlisted command (``IF``, ``ID``, ``TX1``, ...) is
+rejected, since it could key the rig or put an unexpected answer into the
+transaction.  Add an entry there to use another set command.
+Each macro becomes a single byte buffer that is sent in one write, plus the
+read commands that confirm it: the rig's answer to the read must contain the
+set command (``MD0;`` -> ``MD0C;`` confirms ``MD0C``).
+"""
+
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+from .client import CatClient
+from .protocol import FREQ_MAX_HZ, FREQ_MIN_HZ, build_command, build_set_freq
+from .yaesu_cat import COMMANDS
+
+logger = logging.getLogger(__name__)
+
+Step = Union[str, Dict[str, Union[str, int]]]
+
+# mnemonic -> (parameter pattern, number of leading parameter chars the read needs)
+SET_SPECS = {
+    "FA": (r"\d{9}", 0),
+    "FB": (r"\d{9}", 0),
+    "MD": (r"[01][1-9A-F]", 1),
+    "PC": (r"\d{3}", 0),
+    "AN": (r"[01][1-3]", 1),
+    "KS": (r"\d{3}", 0),
+    "SQ": (r"[01]\d{3}", 1),
+    "AG": (r"[01]\d{3}", 1),
+    "RG": (r"[01]\d{3}", 1),
+}
+# mnemonic -> (offset of the numeric value in the parameters, min, max)
+_RANGES = {
+    "FA": (0, FREQ_MIN_HZ, FREQ_MAX_HZ),
+    "FB": (0, FREQ_MIN_HZ, FREQ_MAX_HZ),
+    "PC": (0, 5, 200),
+    "KS": (0, 4, 60),
+    "SQ": (1, 0, 100),
+    "AG": (1, 0, 255),
+    "RG": (1, 0, 255),
+}
+
+
+class MacroError(ValueError):
+    """A macro step is not a valid CAT set command."""
+
+
+class Macro:
+    """A compiled macro: ``payload`` is written as-is; ``reads`` confirm it."""
+
+    __slots__ = ("name", "commands", "payload", "reads")
+
+    def __init__(self, name: str, commands: List[bytes], reads: List[Tuple[bytes, bytes]]):
+        self.name = name
+        self.commands = commands
+        self.payload = b"".join(commands)
+        # (read command, set command the answer must echo)
+        self.reads = reads
+
+
+def compile_step(step: Step) -> Tuple[bytes, Tuple[bytes, bytes]]:
+    """Return (set command, (read command, expected answer content))."""
+    if isinstance(step, dict):
+        if len(step) != 1:
+            raise MacroError(f"dict step must have exactly one key: {step!r}")
+        ((mnemonic, value),) = step.items()
+        mnemonic = str(mnemonic).upper()
+        if mnemonic in ("FA", "FB") and isinstance(value, int):
+            params = build_set_freq(mnemonic, value)[2:-1].decode("ascii")
+        else:
+            params = str(value).strip().upper()
+    elif isinstance(step, str):
+        text = step.strip().rstrip(";").upper()
+        mnemonic, params = text[:2], text[2:]
+    else:
+        raise MacroError(f"step must be a string or a one-key dict: {step!r}")
+
+    mnemonic = mnemonic.upper()
+    if mnemonic not in COMMANDS:
+        raise MacroError(f"unknown command {mnemonic!r}")
+    spec = SET_SPECS.get(mnemonic)
+    if spec is None:
+        raise MacroError(f"{mnemonic} has no known set layout; add it to SET_SPECS to use it in a macro")
+    try:
+        cmd = build_command(mnemonic, params)
+    except (ValueError, UnicodeEncodeError) as e:
+        raise MacroError(f"{mnemonic}: {e}") from None
+    pattern, read_len = spec
+    if not re.fullmatch(pattern, params):
+        raise MacroError(f"{mnemonic}: parameters {params!r} do not match {pattern}")
+    if mnemonic in _RANGES:
+        offset, lo, hi = _RANGES[mnemonic]
+        if not lo <= int(params[offset:]) <= hi:
+            raise MacroError(f"{mnemonic}: {params[offset:]} outside {lo}-{hi}")
+    return cmd, (build_command(mnemonic, params[:read_len]), cmd[:-1])
+
+
+def compile_macro(name: str, steps: List[Step]) -> Macro:
+    if not steps:
+        raise MacroError(f"macro {name!r} has no steps")
+    commands: List[bytes] = []
+    reads: List[Tuple[bytes, bytes]] = []
+    for i, step in enumerate(steps):
+        try:
+            cmd, read = compile_step(step)
+        except MacroError as e:
+            raise MacroError(f"macro {name!r} step {i + 1}: {e}") from None
+        commands.append(cmd)
+        reads.append(read)
+    return Macro(name, commands, reads)
+
+
+def compile_macros(source: Dict[str, List[Step]], skip_invalid: bool = False) -> Dict[str, Macro]:
+    """Compile every macro in ``source``.
+
+    Raises MacroError on the first bad step, or with ``skip_invalid`` logs it
+    and leaves that macro out so one typo does not take the others down.
+    """
+    compiled = {}
+    for name, steps in source.items():
+        try:
+            compiled[name] = compile_macro(name, steps)
+        except MacroError as e:
+            if not skip_invalid:
+                raise
+            logger.error("skipping macro: %s", e)
+    return compiled
+
+
+def run_macro(cat: CatClient, macro: Macro, confirm: bool = False, timeout: Optional[float] = None) -> dict:
+    """Send ``macro`` in one write, followed (with ``confirm``) by every read-back.
+
+    Returns {"confirmed": True/False/None, "mismatches": [...], "elapsed_ms": ...}.
+    Exceptions from the CatClient (CatError, serial errors) propagate.
+    """
+    t0 = time.monotonic()
+    reads = macro.reads if confirm else []
+    sent, *futures = cat.send_then_query(macro.payload, [read for read, _ in reads], timeout=timeout)
+    result = {"confirmed": None, "mismatches": []}
+    if reads:
+        for (read, expected), fut in zip(reads, futures):
+            answer = fut.result()
+            if expected not in answer:
+                result["mismatches"].append({"read": read.decode("ascii"), "expected": expected.decode("ascii"),
+                                             "answer": answer.decode("ascii", "replace")})
+        result["confirmed"] = not result["mismatches"]
+    sent.result()
+    result["elapsed_ms"] = round((time.monotonic() - t0) * 1000.0, 1)
+    return result
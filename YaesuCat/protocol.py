@@ -1,6 +1,10 @@
 import re
 from .yaesu_cat import COMMANDS
 
+# FA/FB set range from mainCat.txt (P1 000030000 - 075000000 Hz)
+FREQ_MIN_HZ = 30_000
+FREQ_MAX_HZ = 75_000_000
+
 
 def _hz_to_9ascii(hz: int) -> bytes:
     return f"{int(hz):09d}".encode("ascii")
@@ -20,3 +24,64 @@ def parse_freq_response(resp: bytes) -> int:
     if not m:
         raise ValueError("no 9-digit frequency found in response")
     return int(m.group(1))
+
+
+def build_command(mnemonic: str, params: str = "") -> bytes:
+    """Build any CAT command from its mnemonic and already-formatted parameters.
+
+    Example: build_command('MD', '02') -> b'MD02;'
+    """
+    if mnemonic not in COMMANDS:
+        raise ValueError(f"Unknown command: {mnemonic}")
+    if ";" in params:
+        raise ValueError("parameters must not contain ';'")
+    return COMMANDS[mnemonic]["mnemonic"].encode("ascii") + params.encode("ascii") + b";"
+
+
+# P6 of IF/OI and P2 of MD
+MODES = {
+    "1": "LSB", "2": "USB", "3": "CW-U", "4": "FM", "5": "AM", "6": "RTTY-L",
+    "7": "CW-L", "8": "DATA-L", "9": "RTTY-U", "A": "DATA-FM", "B": "FM-N",
+    "C": "DATA-U", "D": "AM-N", "E": "PSK", "F": "DATA-FM-N",
+}
+# P7 of IF/OI
+CHANNEL_MODES = {"0": "VFO", "1": "Memory", "2": "Memory Tune", "3": "QMB", "4": "-", "5": "PMS"}
+# P8 of IF/OI
+TONE_MODES = {"0": "OFF", "1": "CTCSS ENC/DEC", "2": "CTCSS ENC"}
+# P10 of IF/OI
+SHIFTS = {"0": "Simplex", "1": "Plus", "2": "Minus"}
+
+# IF/OI answer: mnemonic + P1(3) P2(9) P3(5) P4 P5 P6 P7 P8 P9(2) P10 + ';'
+_INFO_RE = re.compile(
+    rb"(IF|OI)(.{3})(\d{9})([+-]\d{4})([01])([01])([0-9A-F])(\d)(\d)(\d{2})(\d);"
+)
+
+
+def build_get_info(sub: bool = False) -> bytes:
+    """IF; reads the main band (VFO-A), OI; the opposite (sub, VFO-B) band."""
+    return build_command("OI" if sub else "IF")
+
+
+def parse_info_response(resp: bytes) -> dict:
+    """Decode an IF (main band) or OI (sub band) answer frame.
+
+    Example: parse_info_response(b'IF001014250000+000000200000;')
+    -> {'band': 'main', 'hz': 14250000, 'mode': 'USB', 'clar_offset': 0, ...}
+    Raises ValueError if the frame does not match the documented layout.
+    """
+    m = _INFO_RE.search(resp)
+    if not m:
+        raise ValueError("not an IF/OI answer")
+    mn, chan, hz, clar, rx_clar, tx_clar, mode, ch_mode, tone, _fixed, shift = m.groups()
+    return {
+        "band": "main" if mn == b"IF" else "sub",
+        "memory_channel": chan.decode("ascii", "replace"),
+        "hz": int(hz),
+        "clar_offset": int(clar),
+        "rx_clar": rx_clar == b"1",
+        "tx_clar": tx_clar == b"1",
+        "mode": MODES.get(mode.decode("ascii"), "?"),
+        "channel_mode": CHANNEL_MODES.get(ch_mode.decode("ascii"), "?"),
+        "tone": TONE_MODES.get(tone.decode("ascii"), "?"),
+        "shift": SHIFTS.get(shift.decode("ascii"), "?"),
+    }
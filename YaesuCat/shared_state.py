@@ -0,0 +1,261 @@
+"""Share rig state between one I/O process and many web worker processes.
+
+The I/O process owns the serial port and is the only writer of a
+``multiprocessing.shared_memory`` segment guarded by a seqlock::
+
+    offset 0: u64 sequence (odd while a write is in progress)
+    offset 8: u64 generation (random per writer; 0 once the writer has closed)
+    offset 16: u32 payload length
+    offset 20: payload (UTF-8 JSON, at most ``size - 20`` bytes)
+
+Readers copy the payload and retry if the sequence was odd or changed while
+they copied, so web workers never block the writer and never take a lock.
+A restarted I/O process creates a new segment under the same name; readers
+notice through ``stale()`` (the generation differs) and attach again.
+
+Writes (e.g. ``/set_freq``) travel the other way over a small
+``multiprocessing.connection`` channel: ``CommandClient.call()`` sends
+``(name, kwargs)`` and waits for the I/O process's reply.  That channel
+unpickles what it receives, so the authkey must be a secret: anyone holding
+it can run code in the I/O process.
+"""
+
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SEQ = struct.Struct("<Q")
+_GEN = struct.Struct("<Q")
+_LEN = struct.Struct("<I")
+_GEN_OFFSET = _SEQ.size
+_LEN_OFFSET = _GEN_OFFSET + _GEN.size
+_PAYLOAD_OFFSET = _LEN_OFFSET + _LEN.size
+
+# segments created by this process; the resource tracker must keep tracking those
+_created_here = set()
+
+
+class SharedStateError(RuntimeError):
+    """No consistent snapshot: the writer died mid-publish or the segment was closed."""
+
+
+def _open_untracked(name: str) -> shared_memory.SharedMemory:
+    shm = shared_memory.SharedMemory(name=name)
+    if name not in _created_here:
+        try:
+            # readers must not unlink the segment when they exit (bpo-39959)
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore[attr-defined]
+        except Exception:
+            pass
+    return shm
+
+
+class SharedRigState:
+    """Seqlock-protected JSON snapshot in a named shared memory segment.
+
+    Use ``SharedRigState.create(name)`` in the process that publishes and
+    ``SharedRigState.attach(name)`` everywhere else.  Only one process may
+    publish.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._buf = shm.buf
+        self._owner = owner
+        self._seq = 0
+        self.generation = _GEN.unpack_from(self._buf, _GEN_OFFSET)[0]
+
+    @classmethod
+    def create(cls, name: str, size: int = 4096) -> "SharedRigState":
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # left behind by an I/O process that died; take it over
+            shm = shared_memory.SharedMemory(name=name)
+        shm.buf[:_PAYLOAD_OFFSET] = bytes(_PAYLOAD_OFFSET)
+        # nonzero, and different from whatever a previous writer used
+        _GEN.pack_into(shm.buf, _GEN_OFFSET, int.from_bytes(os.urandom(8), "little") | 1)
+        _created_here.add(name)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRigState":
+        return cls(_open_untracked(name), owner=False)
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf) - _PAYLOAD_OFFSET
+
+    def publish(self, state: Dict) -> None:
+        """Write a new snapshot. Raises ValueError if it does not fit."""
+        data = json.dumps(state, separators=(",", ":")).encode("utf-8")
+        if len(data) > self.capacity:
+            raise ValueError(f"state is {len(data)} bytes, segment holds {self.capacity}")
+        buf = self._buf
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+        _LEN.pack_into(buf, _LEN_OFFSET, len(data))
+        buf[_PAYLOAD_OFFSET:_PAYLOAD_OFFSET + len(data)] = data
+        self._seq += 1
+        _SEQ.pack_into(buf, 0, self._seq)
+
+    def version(self) -> int:
+        """Number of completed publishes (cheap; no payload copy)."""
+        try:
+            return _SEQ.unpack_from(self._buf, 0)[0] // 2
+        except (TypeError, ValueError):
+            raise SharedStateError("segment closed") from None
+
+    def read(self, timeout: float = 0.1) -> Tuple[int, Dict]:
+        """Return ``(version, state)``; ``state`` is {} before the first publish.
+
+        Raises SharedStateError if no consistent snapshot turns up within
+        ``timeout`` s (a writer that died mid-publish leaves the sequence odd).
+        """
+        buf = self._buf
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                s1 = _SEQ.unpack_from(buf, 0)[0]
+                if not s1 & 1:
+                    (n,) = _LEN.unpack_from(buf, _LEN_OFFSET)
+                    data = bytes(buf[_PAYLOAD_OFFSET:_PAYLOAD_OFFSET + min(n, self.capacity)])
+                    if _SEQ.unpack_from(buf, 0)[0] == s1:
+                        return s1 // 2, (json.loads(data) if n else {})
+                if time.monotonic() >= deadline:
+                    raise SharedStateError("writer stopped in the middle of a publish")
+                time.sleep(0)
+        except (TypeError, ValueError) as e:
+            # another thread closed this handle; json errors mean a torn read of a dead writer
+            raise SharedStateError(f"segment unreadable: {e}") from None
+
+    def stale(self) -> bool:
+        """True if the writer closed this segment or a new writer replaced it under the same name."""
+        try:
+            if _GEN.unpack_from(self._buf, _GEN_OFFSET)[0] != self.generation:
+                return True
+            shm = _open_untracked(self._shm.name)
+        except FileNotFoundError:
+            return True
+        except (TypeError, ValueError):
+            return True
+        try:
+            return _GEN.unpack_from(shm.buf, _GEN_OFFSET)[0] != self.generation
+        finally:
+            shm.close()
+
+    def close(self) -> None:
+        if self._owner and self._buf is not None:
+            # tell readers still mapping this segment that it is gone
+            _GEN.pack_into(self._buf, _GEN_OFFSET, 0)
+        self._buf = None
+        self._shm.close()
+        if self._owner:
+            _created_here.discard(self._shm.name)
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def serve_commands(address, authkey: bytes, handler: Callable[[str, Dict], Dict]) -> Listener:
+    """Accept ``(name, kwargs)`` requests on ``address`` in background threads.
+
+    ``handler`` runs in the I/O process and returns ``{"body": ..., "code": ...}``,
+    which is sent back to the caller; an exception in ``handler`` is sent back
+    as a 500 reply.  Returns the listener (its ``address`` is the bound address).
+    """
+    listener = Listener(address, authkey=authkey)
+
+    def handle(conn) -> None:
+        with conn:
+            while True:
+                try:
+                    name, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = handler(name, kwargs)
+                except Exception as e:
+                    logger.exception("command %s failed", name)
+                    # same shape as a handler reply, so callers need no special case
+                    reply = {"body": {"status": "error", "reason": str(e)}, "code": 500}
+                try:
+                    conn.send(reply)
+                except (EOFError, OSError):
+                    return
+
+    def accept_loop() -> None:
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            except Exception:
+                # failed authentication etc.; keep serving other workers
+                logger.warning("rejected command connection", exc_info=True)
+                continue
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, name="rig-commands", daemon=True).start()
+    return listener
+
+
+class CommandClient:
+    """Per-process connection to ``serve_commands``; reconnects once on failure."""
+
+    def __init__(self, address, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def call(self, name: str, **kwargs) -> Dict:
+        """Send one command and return the reply; EOFError/OSError if it fails.
+
+        Only connecting and sending are retried.  Once the request is out the
+        I/O process may already have run it, and commands such as ``cw_send``
+        must not run twice, so a failed ``recv()`` is raised at once.
+        """
+        with self._lock:
+            try:
+                self._send_locked(name, kwargs)
+            except (EOFError, OSError):
+                # the I/O process may have restarted; try a fresh connection once
+                self._drop()
+                try:
+                    self._send_locked(name, kwargs)
+                except (EOFError, OSError):
+                    self._drop()
+                    raise
+            try:
+                return self._conn.recv()
+            except (EOFError, OSError):
+                self._drop()
+                raise
+
+    def _send_locked(self, name: str, kwargs: Dict) -> None:
+        if self._conn is None:
+            self._conn = Client(self.address, authkey=self.authkey)
+        self._conn.send((name, kwargs))
+
+    def _drop(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._drop()
@@ -0,0 +1,110 @@
+"""Sampled span tracing for the CAT hot path, exported as Chrome trace events.
+
+A ``Tracer`` decides per operation (one poll cycle, one SSE push, ...) whether
+to trace it.  Unsampled operations get ``None`` instead of a ``Trace`` and
+every helper accepts ``None``, so with tracing off the cost is one float
+comparison per operation and a shared no-op context manager per span::
+
+    trace = tracer.start("poll")
+    with span(trace, "parse"):
+        ...
+    tracer.finish(trace)
+
+Finished traces are kept in a ring buffer; ``tracer.chrome_trace()`` returns
+them in the Trace Event Format understood by chrome://tracing and Perfetto.
+"""
+
+import contextlib
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Trace:
+    """Spans recorded for one sampled operation."""
+
+    __slots__ = ("id", "name", "start", "end", "spans")
+
+    def __init__(self, trace_id: int, name: str):
+        self.id = trace_id
+        self.name = name
+        self.start = time.perf_counter()
+        self.end = 0.0
+        # (name, start, end, thread ident); list.append is atomic, so any thread may add
+        self.spans: List[tuple] = []
+
+    def add(self, name: str, start: float, end: float) -> None:
+        self.spans.append((name, start, end, threading.get_ident()))
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, t0, time.perf_counter())
+
+
+def span(trace: Optional[Trace], name: str):
+    """Context manager timing ``name`` inside ``trace``; a no-op when ``trace`` is None."""
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name)
+
+
+def add_span(trace: Optional[Trace], name: str, start: float, end: float) -> None:
+    """Record an already-measured span (``time.perf_counter()`` values)."""
+    if trace is not None:
+        trace.add(name, start, end)
+
+
+class Tracer:
+    """Samples operations at ``sample_rate`` (0 = off, 1 = all) into a ring buffer."""
+
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 256):
+        self.sample_rate = sample_rate
+        self._traces: "deque[Trace]" = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        # perf_counter has an arbitrary origin; exported timestamps are relative to this
+        self._origin = time.perf_counter()
+
+    def start(self, name: str) -> Optional[Trace]:
+        rate = self.sample_rate
+        if rate <= 0.0 or (rate < 1.0 and random.random() >= rate):
+            return None
+        return Trace(next(self._ids), name)
+
+    def finish(self, trace: Optional[Trace]) -> None:
+        if trace is None:
+            return
+        trace.end = time.perf_counter()
+        self._traces.append(trace)
+
+    def clear(self) -> None:
+        self._traces.clear()
+
+    def chrome_trace(self) -> Dict:
+        """Finished traces as a Chrome trace-event JSON object (timestamps in us)."""
+        pid = os.getpid()
+        origin = self._origin
+        events = []
+        for tr in list(self._traces):
+            # one row per trace: the whole operation with its spans nested underneath
+            events.append({
+                "name": tr.name, "cat": "trace", "ph": "X", "pid": pid, "tid": tr.id,
+                "ts": (tr.start - origin) * 1e6, "dur": (tr.end - tr.start) * 1e6,
+            })
+            for name, t0, t1, thread in list(tr.spans):
+                events.append({
+                    "name": name, "cat": tr.name, "ph": "X", "pid": pid, "tid": tr.id,
+                    "ts": (t0 - origin) * 1e6, "dur": (t1 - t0) * 1e6,
+                    "args": {"thread": thread},
+                })
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"sample_rate": self.sample_rate}}
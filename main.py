@@ -1,10 +1,9 @@
-from typing import Optional, Any as _Any
+from typing import Optional, Tuple, Any as _Any
 try:
-    from flask import Flask, render_template_string, jsonify, Response, stream_with_context, request
+    from flask import Flask, jsonify, Response, stream_with_context, request
 except Exception:
     # Fallbacks for static analysis / IDEs that haven't indexed the venv yet
     Flask = _Any
-    render_template_string = _Any
     jsonify = _Any
     Response = _Any
     stream_with_context = _Any
@@ -15,56 +14,158 @@ import time
 import json
 import logging
 import os
+import atexit
 
 # configure simple logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Try to import the YaesuCat package; fall back gracefully if missing
-yaesu_protocol = None
-try:
-    from YaesuCat import protocol as yaesu_protocol  # type: ignore
-    logger.info("Imported YaesuCat.protocol successfully")
-except Exception as e:
-    logger.warning("YaesuCat.protocol not available, falling back to simple ASCII commands: %s", e)
-    yaesu_protocol = None
-
-app = Flask(__name__)
+from YaesuCat import protocol as yaesu_protocol
+from YaesuCat.client import CatClient, CatError
+from YaesuCat import capture as cat_capture
+from YaesuCat.assets import load_assets
+from YaesuCat.keyer import CwSender
+from YaesuCat.macros import compile_macros, run_macro
+from YaesuCat.tracing import Tracer, add_span, span
+from YaesuCat.shared_state import CommandClient, SharedRigState, SharedStateError, serve_commands
+
+# static/ is served from memory by _send_asset(), not by Flask's static view
+app = Flask(__name__, static_folder=None)
+# UI files, read, fingerprinted and compressed once at startup (restart to pick up edits)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+assets = load_assets(STATIC_DIR)
 
 SER_PORT = "COM21"
 SER_BAUD = 38400
+# Optional second CAT port (the rig's other USB virtual COM port). When set,
+# SER_PORT is used only for polling and operator writes go out on this port.
+SER_PORT_CTRL = os.environ.get("YAESU_CTRL_PORT")
+
+# Record all serial traffic to this file (see YaesuCat/capture.py)
+CAPTURE_PATH = os.environ.get("YAESU_CAPTURE")
+# Replay a capture instead of opening SER_PORT; speed 0 = as fast as possible
+REPLAY_PATH = os.environ.get("YAESU_REPLAY")
+REPLAY_SPEED = float(os.environ.get("YAESU_REPLAY_SPEED", "1.0"))
+# one writer per capture file; the control port records to "<CAPTURE_PATH>.ctrl"
+_capture_writers = {}
+
+# Fraction of poll cycles / SSE pushes / sets to trace (0 = off); see /debug/trace
+tracer = Tracer(sample_rate=float(os.environ.get("YAESU_TRACE_SAMPLE", "0")))
+
+# "freq" polls FA/FB; "info" polls IF/OI, which also report mode, clarifier etc.
+POLL_MODE = os.environ.get("YAESU_POLL_MODE", "freq")
+
+# Process role (see YaesuCat/shared_state.py):
+#   standalone - poll the rig and serve HTTP from this process (default)
+#   io         - as standalone, plus publish state to shared memory and accept
+#                writes forwarded by web workers
+#   web        - never open the port; read state from shared memory and forward
+#                writes to the io process (run any number of these under a WSGI server)
+RIG_ROLE = os.environ.get("YAESU_ROLE", "standalone")
+SHM_NAME = os.environ.get("YAESU_SHM_NAME", "yaesu_rig_state")
+CMD_ADDRESS = ("127.0.0.1", int(os.environ.get("YAESU_CMD_PORT", "5001")))
+# The command channel unpickles what it receives, so a key anyone can read in this
+# file would let any local process run code in the process that can transmit.
+CMD_AUTHKEY = os.environ.get("YAESU_CMD_AUTHKEY", "").encode("utf-8")
+if RIG_ROLE in ("io", "web") and not CMD_AUTHKEY:
+    raise RuntimeError(f"YAESU_ROLE={RIG_ROLE} needs a secret YAESU_CMD_AUTHKEY shared by the io and web processes")
+shared_state: Optional[SharedRigState] = None
+# web role: how often to check that the io process has not replaced the segment
+SHM_RECHECK = 1.0
+_shm_lock = threading.Lock()
+_shm_checked = 0.0
+_commands: Optional[CommandClient] = None
 
 ser: Optional[serial.Serial] = None
-latest_freq = "Unknown"
-latest_freq_b = "Unknown"
+# control port connection (dual-port mode only)
+ser_ctrl: Optional[serial.Serial] = None
+# last frequency per receiver in Hz (None until known); the browser formats it
+latest_hz = {"FA": None, "FB": None}
+# text shown instead of the frequency (serial error, unparseable answer), else None
+latest_error = {"FA": None, "FB": None}
 # single lock for protecting latest values
 latest_lock = threading.Lock()
+# notified (under latest_lock) whenever a displayed value changes so SSE pushes at once
+latest_changed = threading.Condition(latest_lock)
+state_version = 0
+# decoded IF/OI answers (POLL_MODE "info" only)
+latest_info = {"FA": None, "FB": None}
+# True while a /set_freq value is shown optimistically and awaiting read-back
+latest_pending = {"FA": False, "FB": False}
+# bumped by every set so a poll answer that raced a write is not applied
+_set_gen = {"FA": 0, "FB": 0}
 # single lock for serial access
 serial_lock = threading.Lock()
+# all rig traffic goes through this client; it takes serial_lock per batch
+cat = CatClient(lambda: ser, serial_lock)
+# writes and other latency-sensitive traffic; its own port in dual-port mode
+ctrl_lock = threading.Lock()
+cat_ctrl = cat
+if SER_PORT_CTRL:
+    cat_ctrl = CatClient(lambda: _ctrl_serial(), ctrl_lock, on_io_error=lambda e: _drop_ctrl_serial())
+# free-text CW via keyer memories; shares the bus with polling through cat_ctrl
+cw = CwSender(cat_ctrl)
+
+# Named multi-command setups, compiled at startup (see YaesuCat/macros.py and
+# macros.example.json)
+MACROS_PATH = os.environ.get("YAESU_MACROS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "macros.json"))
+
+
+def _load_macros(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            source = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error("could not read macros from %s: %s", path, e)
+        return {}
+    if not isinstance(source, dict):
+        logger.error("could not read macros from %s: expected a json object", path)
+        return {}
+    compiled = compile_macros(source, skip_invalid=True)
+    logger.info("Loaded %d macro(s) from %s", len(compiled), path)
+    return compiled
+
+
+macros = _load_macros(MACROS_PATH)
 
-# Helper wrappers so code works whether yaesu_protocol is present or not
-import re
 
 def _build_get_cmd(vfo: str) -> bytes:
-    if yaesu_protocol is not None:
-        return yaesu_protocol.build_get_freq(vfo)
-    return f"{vfo};".encode("ascii")
+    return yaesu_protocol.build_get_freq(vfo)
 
 
 def _build_set_cmd(vfo: str, hz: int) -> bytes:
-    if yaesu_protocol is not None:
-        return yaesu_protocol.build_set_freq(vfo, hz)
-    # fallback: 9-digit ASCII payload
-    return f"{vfo}{int(hz):09d};".encode("ascii")
+    return yaesu_protocol.build_set_freq(vfo, hz)
 
 
 def _parse_hz_resp(resp: bytes) -> int:
-    if yaesu_protocol is not None:
-        return yaesu_protocol.parse_freq_response(resp)
-    m = re.search(rb"(\d{9})", resp)
-    if not m:
-        raise ValueError("no 9-digit frequency found in response")
-    return int(m.group(1))
+    return yaesu_protocol.parse_freq_response(resp)
+
+
+def _connect(port: str, suffix: str = ""):
+    """Open one CAT port (or its replay), wrapped for capture when enabled."""
+    if REPLAY_PATH:
+        s = cat_capture.ReplaySerial(REPLAY_PATH + suffix, speed=REPLAY_SPEED, timeout=0.15)
+    else:
+        s = serial.Serial(
+            port=port,
+            baudrate=SER_BAUD,
+            bytesize=serial.EIGHTBITS,
+            parity=serial.PARITY_NONE,
+            stopbits=serial.STOPBITS_TWO,
+            # shorter timeout so reads return quickly and the UI updates faster
+            timeout=0.15,
+        )
+    if CAPTURE_PATH:
+        # one file per port per process; reconnects keep appending to it
+        path = CAPTURE_PATH + suffix
+        writer = _capture_writers.get(path)
+        if writer is None:
+            writer = _capture_writers[path] = cat_capture.CaptureWriter(path)
+            atexit.register(writer.close)
+        s = cat_capture.CaptureSerial(s, writer)
+    return s
 
 
 def open_serial() -> None:
@@ -72,15 +173,7 @@ def open_serial() -> None:
     backoff = 1.0
     while True:
         try:
-            ser = serial.Serial(
-                port=SER_PORT,
-                baudrate=SER_BAUD,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_TWO,
-                # shorter timeout so reads return quickly and the UI updates faster
-                timeout=0.15,
-            )
+            ser = _connect(SER_PORT)
             return
         except (serial.SerialException, OSError):
             ser = None
@@ -88,28 +181,98 @@ def open_serial() -> None:
             backoff = min(10.0, backoff * 2)
 
 
-def _hz_to_display(hz: int) -> str:
-    mhz = hz / 1_000_000
-    return f"{mhz:.5f} MHz"
+def _ctrl_serial():
+    """Control port for cat_ctrl; one connect attempt per batch, None if unavailable."""
+    global ser_ctrl
+    if ser_ctrl is None or not getattr(ser_ctrl, "is_open", False):
+        try:
+            ser_ctrl = _connect(SER_PORT_CTRL, ".ctrl")
+        except (serial.SerialException, OSError) as e:
+            logger.warning("control port %s unavailable: %s", SER_PORT_CTRL, e)
+            ser_ctrl = None
+    return ser_ctrl
 
 
-def _serial_readline(s: serial.Serial) -> bytes:
-    """Read until b';' if available, else fallback to readline(). Return raw bytes."""
-    # prefer read_until if available
-    if hasattr(s, "read_until"):
-        try:
-            return s.read_until(b";")
-        except Exception:
-            pass
-    # fallback
+def _drop_ctrl_serial() -> None:
+    global ser_ctrl
+    s, ser_ctrl = ser_ctrl, None
+    try:
+        if s is not None and hasattr(s, "close"):
+            s.close()
+    except Exception:
+        pass
+
+
+def _state_payload_locked() -> dict:
+    return {
+        "hz": latest_hz["FA"],
+        "hz_b": latest_hz["FB"],
+        "error": latest_error["FA"],
+        "error_b": latest_error["FB"],
+        "pending": latest_pending["FA"],
+        "pending_b": latest_pending["FB"],
+        "info": latest_info["FA"],
+        "info_b": latest_info["FB"],
+    }
+
+
+def _store_locked(vfo: str, hz: Optional[int], error: Optional[str] = None,
+                  pending: Optional[bool] = None, info: Optional[dict] = None) -> None:
+    """Update the frequency or error text (and pending flag / IF-OI info) for FA/FB and wake SSE streams.
+
+    Caller must hold latest_lock.
+    """
+    global state_version
+    changed = False
+    if pending is not None and latest_pending[vfo] != pending:
+        latest_pending[vfo] = pending
+        changed = True
+    if info is not None and latest_info[vfo] != info:
+        latest_info[vfo] = info
+        changed = True
+    if latest_hz[vfo] != hz or latest_error[vfo] != error:
+        latest_hz[vfo] = hz
+        latest_error[vfo] = error
+        changed = True
+    if changed:
+        state_version += 1
+        latest_changed.notify_all()
+        if shared_state is not None:
+            shared_state.publish(_state_payload_locked())
+
+
+def _hz_from_raw(raw: bytes, trace=None) -> Tuple[Optional[int], Optional[str]]:
+    """Return (Hz, None), or (None, best-effort decode of the answer) if it does not parse."""
     try:
-        return s.readline()
+        with span(trace, "_parse_hz_resp"):
+            return _parse_hz_resp(raw), None
     except Exception:
+        return None, raw.decode(errors="ignore").strip() or "Invalid"
+
+
+def _decode_poll_answer(raw: bytes, trace=None) -> Tuple[Optional[int], Optional[str], Optional[dict]]:
+    """Return (Hz, error text, decoded IF/OI fields or None) for one poll answer."""
+    if POLL_MODE != "info":
+        return _hz_from_raw(raw, trace) + (None,)
+    try:
+        with span(trace, "parse_info_response"):
+            info = yaesu_protocol.parse_info_response(raw)
+    except ValueError:
+        # IF/OI frames contain other digit runs, so no 9-digit fallback here
+        return None, raw.decode(errors="ignore").strip() or "Invalid", None
+    return info["hz"], None, info
+
+
+def _answer_or_empty(fut) -> bytes:
+    """Wait for a CatClient answer; b"" on timeout/rejection, serial errors propagate."""
+    try:
+        return fut.result()
+    except CatError:
         return b""
 
 
 def poll_frequency() -> None:
-    global ser, latest_freq, latest_freq_b
+    global ser
     while True:
         try:
             # ensure we have a serial instance open
@@ -122,58 +285,38 @@ def poll_frequency() -> None:
                 time.sleep(0.02)
                 continue
 
-            # Query both receivers quickly while holding the serial lock
-            with serial_lock:
-                # flush input buffer if available
-                if hasattr(s, "reset_input_buffer"):
-                    try:
-                        s.reset_input_buffer()
-                    except Exception:
-                        pass
-                elif hasattr(s, "flushInput"):
-                    try:
-                        s.flushInput()
-                    except Exception:
-                        pass
-
-                # Query frequency A
-                s.write(_build_get_cmd("FA"))
-                raw = _serial_readline(s)
-
-                # Query frequency B
-                s.write(_build_get_cmd("FB"))
-                raw_b = _serial_readline(s)
-
-            # parse outside lock; use protocol parser for strict 9-digit extraction
-            if raw:
-                try:
-                    hz = _parse_hz_resp(raw)
-                    parsed = _hz_to_display(hz)
-                except Exception:
-                    # fallback to best-effort decode
-                    try:
-                        parsed = raw.decode(errors="ignore").strip()
-                    except Exception:
-                        parsed = "Invalid"
-                with latest_lock:
-                    latest_freq = parsed
-
-            if raw_b:
-                try:
-                    hz_b = _parse_hz_resp(raw_b)
-                    parsed_b = _hz_to_display(hz_b)
-                except Exception:
-                    try:
-                        parsed_b = raw_b.decode(errors="ignore").strip()
-                    except Exception:
-                        parsed_b = "Invalid"
+            # Query both receivers in a single write; answers are matched by mnemonic.
+            # IF/OI each carry a whole receiver's state in one frame.
+            trace = tracer.start("poll")
+            with latest_lock:
+                gen = dict(_set_gen)
+            if POLL_MODE == "info":
+                cmds = [yaesu_protocol.build_get_info(), yaesu_protocol.build_get_info(sub=True)]
+            else:
+                cmds = [_build_get_cmd("FA"), _build_get_cmd("FB")]
+            fut_a, fut_b = cat.query_many(cmds, trace=trace)
+            answers = {"FA": _answer_or_empty(fut_a), "FB": _answer_or_empty(fut_b)}
+
+            # parse outside the lock; use protocol parsers for strict field extraction
+            for vfo, raw in answers.items():
+                if not raw:
+                    continue
+                hz, error, info = _decode_poll_answer(raw, trace)
+                t_lock = time.perf_counter() if trace is not None else 0.0
                 with latest_lock:
-                    latest_freq_b = parsed_b
+                    if trace is not None:
+                        add_span(trace, "latest_lock.wait", t_lock, time.perf_counter())
+                    # a set in flight owns the value until its read-back lands
+                    if latest_pending[vfo] or _set_gen[vfo] != gen[vfo]:
+                        continue
+                    with span(trace, "store"):
+                        _store_locked(vfo, hz, error, info=info)
+            tracer.finish(trace)
 
         except (serial.SerialException, OSError) as e:
             with latest_lock:
-                latest_freq = f"Error: {e}"
-                latest_freq_b = f"Error: {e}"
+                _store_locked("FA", None, f"Error: {e}")
+                _store_locked("FB", None, f"Error: {e}")
             try:
                 if ser is not None and hasattr(ser, "close"):
                     ser.close()
@@ -185,187 +328,336 @@ def poll_frequency() -> None:
         time.sleep(0.02)
 
 
-threading.Thread(target=poll_frequency, daemon=True).start()
+def _send_asset(name: str):
+    """Serve a preloaded static file: pre-compressed variant, ETag and 304 revalidation."""
+    asset = assets.get(name)
+    if asset is None:
+        return jsonify({"status": "error", "reason": "not found"}), 404
+    encoding, body, etag = asset.select(request.headers.get("Accept-Encoding", ""))
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    # fingerprinted URLs (see YaesuCat/assets.py) never change; anything else revalidates
+    if request.args.get("v") == asset.digest:
+        headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "no-cache"
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    if_none_match = request.headers.get("If-None-Match", "")
+    if if_none_match.strip() == "*" or etag in (t.strip() for t in if_none_match.split(",")):
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype=asset.mimetype, headers=headers)
 
 
 @app.route("/")
 def index():
-    html = """
-    <!doctype html>
-    <html>
-    <head>
-      <title>Yaesu CAT Control</title>
-      <style>
-        #freq-box, #freq-box-b {
-          width: 300px; height: 100px;
-          border: 2px solid #333;
-          font-size: 28px;
-          font-weight: bold;
-          text-align: center;
-          line-height: 100px;
-          margin: 20px auto;
-          background-color: #f0f0f0;
-        }
-        .controls { text-align:center; margin: 10px; }
-        .controls input { width: 200px; font-size: 18px; }
-        .controls button { font-size: 16px; }
-      </style>
-    </head>
-    <body>
-      <h1>Yaesu CAT Web Control Active</h1>
-      <div id="freq-box">Loading A...</div>
-      <div class="controls">
-        <form id="form-a" onsubmit="(async function(e){ e.preventDefault(); const v=document.getElementById('freq-input-a').value; if(!v || String(v).trim()==='') return alert('Enter MHz for A'); const ok=await setFreq('FA', v); if(ok) alert('Set A'); return false; })(event);">
-          <input id="freq-input-a" name="freq-a" type="text" step="0.001" placeholder="MHz (e.g. 14.250)" />
-          <button id="set-a" type="submit">Set A</button>
-        </form>
-      </div>
-      <div id="freq-box-b">Loading B...</div>
-      <div class="controls">
-        <form id="form-b" onsubmit="(async function(e){ e.preventDefault(); const v=document.getElementById('freq-input-b').value; if(!v || String(v).trim()==='') return alert('Enter MHz for B'); const ok=await setFreq('FB', v); if(ok) alert('Set B'); return false; })(event);">
-          <input id="freq-input-b" name="freq-b" type="text" step="0.001" placeholder="MHz (e.g. 7.100)" />
-          <button id="set-b" type="submit">Set B</button>
-        </form>
-      </div>
-      <script>
-        const boxA = document.getElementById('freq-box');
-        const boxB = document.getElementById('freq-box-b');
-        const inputA = document.getElementById('freq-input-a');
-        const inputB = document.getElementById('freq-input-b');
-        const setA = document.getElementById('set-a');
-        const setB = document.getElementById('set-b');
-
-        // Accept MHz (decimal) from user, convert to Hz integer before sending
-        async function setFreq(vfo, mhzInput) {
-          try {
-            const mhz = parseFloat(mhzInput);
-            if (!Number.isFinite(mhz)) throw new Error('invalid MHz');
-            // convert MHz to Hz and round to nearest Hz
-            const hz = Math.round(mhz * 1_000_000);
-            const r = await fetch('/set_freq', {
-              method: 'POST',
-              headers: { 'Content-Type': 'application/json' },
-              body: JSON.stringify({ vfo: vfo, hz: hz })
-            });
-            const j = await r.json();
-            if (!r.ok) throw new Error(j.reason || 'set failed');
-            return true;
-          } catch (e) {
-            console.error(e);
-            return false;
-          }
-        }
-
-        // Using forms with onsubmit handlers means Enter reliably triggers submission.
-        // Click and key handlers removed to avoid double submissions.
-
-        // Fallback: if the inputs exist but forms/handlers are missing (cached page),
-        // catch Enter at the document level and call setFreq directly.
-        document.addEventListener('keydown', function(e) {
-          if (e.key === 'Enter' || e.keyCode === 13) {
-            const active = document.activeElement;
-            if (!active) return;
-            if (active.id === 'freq-input-a' || active.id === 'freq-input-b') {
-              e.preventDefault(); e.stopPropagation();
-              const v = active.value;
-              const label = active.id === 'freq-input-a' ? 'A' : 'B';
-              const vfo = active.id === 'freq-input-a' ? 'FA' : 'FB';
-              if (!v || String(v).trim() === '') return alert(`Enter MHz for ${label}`);
-              // call setFreq and show alert on success
-              setFreq(vfo, v).then(ok => { if (ok) alert(`Set ${label}`); });
-            }
-          }
-        });
-
-        if (!!window.EventSource) {
-          const es = new EventSource('/stream');
-          es.onmessage = e => {
-            try {
-              const parsed = JSON.parse(e.data);
-              boxA.innerText = parsed.frequency;
-              boxB.innerText = parsed.frequency_b;
-            } catch (err) {
-              boxA.innerText = 'Error';
-              boxB.innerText = 'Error';
-            }
-          };
-          es.onerror = e => { boxA.innerText = 'Error'; boxB.innerText = 'Error'; console.error(e); };
-        } else {
-          async function update() {
-            try {
-              let r = await fetch('/freq', {cache: "no-store"});
-              let j = await r.json();
-              boxA.innerText = j.frequency;
-              boxB.innerText = j.frequency_b;
-            } catch (e) {
-              boxA.innerText = "Error";
-              boxB.innerText = "Error";
-            }
-          }
-          // poll faster when EventSource is not available
-          setInterval(update, 200);
-          update();
-        }
-      </script>
-    </body>
-    </html>
+    return _send_asset("index.html")
+
+
+@app.route("/static/<path:name>")
+def static_asset(name):
+    return _send_asset(name)
+
+
+def _attach_shared(drop: bool = False) -> Optional[SharedRigState]:
+    """Web role: the io process's current segment, or None if it is not up.
+
+    A restarted io process creates a new segment under the same name, so the
+    mapping is checked every SHM_RECHECK s (and dropped on ``drop``).
     """
-    return render_template_string(html)
+    global shared_state, _shm_checked
+    with _shm_lock:
+        now = time.monotonic()
+        if shared_state is not None and (drop or now - _shm_checked >= SHM_RECHECK):
+            _shm_checked = now
+            if drop or shared_state.stale():
+                logger.info("shared state segment replaced or gone; attaching again")
+                old, shared_state = shared_state, None
+                old.close()
+        if shared_state is None:
+            try:
+                shared_state = SharedRigState.attach(SHM_NAME)
+            except FileNotFoundError:
+                return None
+            _shm_checked = now
+        return shared_state
+
+
+def _unavailable_payload() -> dict:
+    """Web role: what /freq and /stream show while the io process is down."""
+    reason = "I/O process not running"
+    return {"hz": None, "hz_b": None, "error": reason, "error_b": reason,
+            "pending": False, "pending_b": False, "info": None, "info_b": None}
+
+
+def _current_state(seen: Optional[int] = None, wait: float = 0.0):
+    """Return (version, payload); payload is None if still at ``seen`` after ``wait`` s."""
+    if RIG_ROLE == "web":
+        shm = _attach_shared()
+        if shm is not None:
+            try:
+                # no cross-process wakeup; polling the sequence word is just a memory read
+                if wait and shm.version() == seen:
+                    time.sleep(wait)
+                if shm.version() == seen:
+                    return seen, None
+                return shm.read()
+            except SharedStateError as e:
+                logger.warning("shared state unreadable: %s", e)
+                _attach_shared(drop=True)
+        if seen == -1:
+            time.sleep(wait)
+            return -1, None
+        return -1, _unavailable_payload()
+    with latest_lock:
+        # wake as soon as a value changes; the timeout just bounds the wait
+        if wait and seen == state_version:
+            latest_changed.wait(timeout=wait)
+        if seen == state_version:
+            return seen, None
+        return state_version, _state_payload_locked()
 
 
 @app.route("/freq")
 def freq():
-    with latest_lock:
-        return jsonify({"frequency": latest_freq, "frequency_b": latest_freq_b})
+    return jsonify(_current_state()[1])
 
 
 @app.route("/stream")
 def stream():
     def generator():
-        last_a = last_b = None
+        seen = None
         while True:
-            with latest_lock:
-                cur = latest_freq
-                cur_b = latest_freq_b
-            if cur != last_a or cur_b != last_b:
-                last_a, last_b = cur, cur_b
-                yield f"data: {json.dumps({'frequency': cur, 'frequency_b': cur_b})}\n\n"
-            # check more frequently so UI updates faster
-            time.sleep(0.05)
+            # only iterations that push an update are kept in the trace buffer
+            trace = tracer.start("sse")
+            with span(trace, "sse.wait"):
+                seen, payload = _current_state(seen, wait=0.05)
+            if payload is not None:
+                with span(trace, "sse.serialize"):
+                    msg = f"data: {json.dumps(payload)}\n\n"
+                tracer.finish(trace)
+                yield msg
 
     return Response(stream_with_context(generator()), mimetype="text/event-stream")
 
 
 @app.route('/set_freq', methods=['POST'])
 def set_freq():
-    """Set frequency for FA or FB. JSON body: {"vfo": "FA"|"FB", "hz": 14250000} """
-    data = request.get_json(force=True)
-    if not data:
-        return jsonify({"status": "error", "reason": "missing json"}), 400
+    """Set frequency for FA or FB. JSON body: {"vfo": "FA"|"FB", "hz": 14250000}
+
+    The new value is pushed to SSE clients immediately (marked pending) and then
+    confirmed by reading it back; the reply carries "confirmed" and "confirm_ms".
+    """
+    return _run_rig_command("set_freq", request.get_json(force=True))
+
+
+def _run_rig_command(name: str, data):
+    """Run a rig command here, or in the io process when this is a web worker."""
+    if RIG_ROLE == "web":
+        try:
+            reply = _commands.call(name, data=data)
+        except (EOFError, OSError) as e:
+            return jsonify({"status": "error", "reason": f"I/O process unreachable: {e}"}), 503
+        return jsonify(reply["body"]), reply["code"]
+    body, code = _RIG_COMMANDS[name](data)
+    return jsonify(body), code
+
+
+def _apply_set_freq(data) -> Tuple[dict, int]:
+    """Validate and perform a /set_freq request; returns (json body, status code)."""
+    if not isinstance(data, dict) or not data:
+        return {"status": "error", "reason": "missing json"}, 400
     vfo = data.get('vfo')
     hz = data.get('hz')
     if vfo not in ('FA', 'FB'):
-        return jsonify({"status": "error", "reason": "invalid vfo"}), 400
+        return {"status": "error", "reason": "invalid vfo"}, 400
+    # bool is an int subclass; true must not become 1 Hz
+    if isinstance(hz, bool):
+        return {"status": "error", "reason": "invalid hz"}, 400
     try:
         hz = int(hz)
     except Exception:
-        return jsonify({"status": "error", "reason": "invalid hz"}), 400
+        return {"status": "error", "reason": "invalid hz"}, 400
+    # checked before the value is shown to every client as pending
+    if not yaesu_protocol.FREQ_MIN_HZ <= hz <= yaesu_protocol.FREQ_MAX_HZ:
+        return {"status": "error", "reason": f"hz must be between {yaesu_protocol.FREQ_MIN_HZ} "
+                                              f"and {yaesu_protocol.FREQ_MAX_HZ}"}, 400
 
     cmd = _build_set_cmd(vfo, hz)
-    # do serial write under lock
-    with serial_lock:
+    # in dual-port mode cat_ctrl opens the control port itself (CatError if missing)
+    if not SER_PORT_CTRL:
         if ser is None or not getattr(ser, 'is_open', False):
             try:
                 open_serial()
             except Exception:
                 pass
         if ser is None:
-            return jsonify({"status": "error", "reason": "serial unavailable"}), 503
+            return {"status": "error", "reason": "serial unavailable"}, 503
+
+    # show the new value at once, marked pending, then confirm it with a read-back
+    t0 = time.monotonic()
+    trace = tracer.start("set_freq")
+    with latest_lock:
+        previous = (latest_hz[vfo], latest_error[vfo])
+        _set_gen[vfo] += 1
+        my_gen = _set_gen[vfo]
+        _store_locked(vfo, hz, pending=True)
+    try:
+        # one write, so the answer reflects the rig after the set
+        sent, read = cat_ctrl.send_then_query(cmd, [_build_get_cmd(vfo)], trace=trace)
+        raw = read.result()
+        # CatError if the rig answered the set itself with ?;
+        sent.result()
+        with span(trace, "_parse_hz_resp"):
+            actual = _parse_hz_resp(raw)
+    except Exception as e:
+        with latest_lock:
+            # a newer set on the same VFO owns the display from here on
+            if _set_gen[vfo] == my_gen:
+                _store_locked(vfo, *previous, pending=False)
+        tracer.finish(trace)
+        code = 503 if isinstance(e, CatError) else 500
+        return {"status": "error", "reason": str(e), "confirmed": False}, code
+    confirm_ms = round((time.monotonic() - t0) * 1000.0, 1)
+
+    with latest_lock:
+        # confirm, or roll back to whatever the rig actually reports
+        if _set_gen[vfo] == my_gen:
+            _store_locked(vfo, actual, pending=False)
+    tracer.finish(trace)
+    if actual != hz:
+        return {"status": "error", "reason": f"rig reports {actual} Hz",
+                "confirmed": False, "hz": actual, "confirm_ms": confirm_ms}, 409
+    return {"status": "ok", "confirmed": True, "hz": actual, "confirm_ms": confirm_ms}, 200
+
+
+@app.route('/cw', methods=['GET', 'POST'])
+def cw_text():
+    """Queue text for CW. JSON body: {"text": "CQ TEST DE ..."}; GET returns sender status."""
+    if request.method == 'GET':
+        return _run_rig_command("cw_status", None)
+    return _run_rig_command("cw_send", request.get_json(force=True))
+
+
+@app.route('/cw/abort', methods=['POST'])
+def cw_abort():
+    """Stop sending CW at once and drop anything still queued."""
+    return _run_rig_command("cw_abort", None)
+
+
+def _apply_cw_send(data) -> Tuple[dict, int]:
+    text = data.get('text') if isinstance(data, dict) else None
+    if not isinstance(text, str):
+        return {"status": "error", "reason": "missing text"}, 400
+    chunks = cw.send(text)
+    if not chunks:
+        return {"status": "error", "reason": "nothing sendable in text"}, 400
+    return {"status": "ok", "chunks": chunks}, 200
+
+
+def _apply_cw_abort(_data) -> Tuple[dict, int]:
+    return {"status": "ok", "dropped": cw.abort()}, 200
+
+
+def _apply_cw_status(_data) -> Tuple[dict, int]:
+    return {"status": "ok", **cw.status()}, 200
+
+
+@app.route('/macro', methods=['GET'])
+def macro_list():
+    """List the compiled macros and the commands each one sends."""
+    return _run_rig_command("macro_list", None)
+
+
+@app.route('/macro/<name>', methods=['POST'])
+def macro_run(name):
+    """Run a macro in one serial write. Optional JSON body: {"confirm": true} reads every step back."""
+    data = request.get_json(force=True, silent=True)
+    confirm = bool(data.get("confirm")) if isinstance(data, dict) else False
+    return _run_rig_command("macro_run", {"name": name, "confirm": confirm})
+
+
+def _apply_macro_list(_data) -> Tuple[dict, int]:
+    listing = {name: [c.decode("ascii") for c in m.commands] for name, m in macros.items()}
+    return {"status": "ok", "macros": listing}, 200
+
+
+def _apply_macro_run(data) -> Tuple[dict, int]:
+    if not isinstance(data, dict):
+        return {"status": "error", "reason": "missing json"}, 400
+    macro = macros.get(data.get("name"))
+    if macro is None:
+        return {"status": "error", "reason": "unknown macro"}, 404
+    try:
+        result = run_macro(cat_ctrl, macro, confirm=data.get("confirm", False))
+    except CatError as e:
+        return {"status": "error", "reason": str(e)}, 503
+    except Exception as e:
+        return {"status": "error", "reason": str(e)}, 500
+    if result["confirmed"] is False:
+        return {"status": "error", "reason": "read-back mismatch", **result}, 409
+    return {"status": "ok", **result}, 200
+
+
+@app.route('/debug/trace', methods=['GET', 'POST'])
+def debug_trace():
+    """GET: recent traces as Chrome trace-event JSON (load in chrome://tracing or Perfetto).
+
+    POST {"sample_rate": 0.1} sets the fraction of operations traced (0 = off);
+    {"clear": true} empties the buffer. Traces are per process.
+    """
+    if request.method == 'GET':
+        return jsonify(tracer.chrome_trace())
+    data = request.get_json(force=True)
+    if not isinstance(data, dict):
+        return jsonify({"status": "error", "reason": "expected a json object"}), 400
+    if "sample_rate" in data:
+        try:
+            rate = float(data["sample_rate"])
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "reason": "invalid sample_rate"}), 400
+        if not 0.0 <= rate <= 1.0:
+            return jsonify({"status": "error", "reason": "sample_rate must be between 0 and 1"}), 400
+        tracer.sample_rate = rate
+    if data.get("clear"):
+        tracer.clear()
+    return jsonify({"status": "ok", "sample_rate": tracer.sample_rate})
+
+
+# commands a web worker may forward to the io process
+_RIG_COMMANDS = {
+    "set_freq": _apply_set_freq,
+    "cw_send": _apply_cw_send,
+    "cw_abort": _apply_cw_abort,
+    "cw_status": _apply_cw_status,
+    "macro_list": _apply_macro_list,
+    "macro_run": _apply_macro_run,
+}
+
+
+def _handle_command(name: str, kwargs: dict) -> dict:
+    """io role: run a command forwarded by a web worker."""
+    handler = _RIG_COMMANDS.get(name)
+    if handler is None:
+        body, code = {"status": "error", "reason": f"unknown command {name}"}, 400
+    else:
         try:
-            ser.write(cmd)
-            return jsonify({"status": "ok"})
+            body, code = handler(kwargs.get("data"))
         except Exception as e:
-            return jsonify({"status": "error", "reason": str(e)}), 500
+            logger.exception("forwarded command %s failed", name)
+            body, code = {"status": "error", "reason": str(e)}, 500
+    return {"body": body, "code": code}
+
+
+if RIG_ROLE == "web":
+    _commands = CommandClient(CMD_ADDRESS, CMD_AUTHKEY)
+else:
+    if RIG_ROLE == "io":
+        shared_state = SharedRigState.create(SHM_NAME)
+        atexit.register(shared_state.close)
+        with latest_lock:
+            shared_state.publish(_state_payload_locked())
+        serve_commands(CMD_ADDRESS, CMD_AUTHKEY, _handle_command)
+    threading.Thread(target=poll_frequency, daemon=True).start()
 
 
 if __name__ == "__main__":
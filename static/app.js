@@ -0,0 +1,93 @@
+const boxA = document.getElementById('freq-box');
+const boxB = document.getElementById('freq-box-b');
+const infoA = document.getElementById('info-a');
+const infoB = document.getElementById('info-b');
+
+// The server sends raw Hz; formatting happens here
+function formatHz(hz, error) {
+  if (error) return error;
+  if (hz === null || hz === undefined) return 'Unknown';
+  return `${(hz / 1_000_000).toFixed(5)} MHz`;
+}
+
+// IF/OI details are only present when the server polls in "info" mode
+function describe(info) {
+  if (!info) return '';
+  let text = `${info.mode} ${info.channel_mode}`;
+  if (info.rx_clar || info.tx_clar) {
+    const sign = info.clar_offset >= 0 ? '+' : '';
+    text += ` CLAR ${sign}${info.clar_offset} Hz`;
+  }
+  return text;
+}
+
+function render(state) {
+  boxA.innerText = formatHz(state.hz, state.error);
+  boxB.innerText = formatHz(state.hz_b, state.error_b);
+  // dim values that are shown optimistically until the rig confirms them
+  boxA.style.opacity = state.pending ? 0.5 : 1;
+  boxB.style.opacity = state.pending_b ? 0.5 : 1;
+  infoA.innerText = describe(state.info);
+  infoB.innerText = describe(state.info_b);
+}
+
+function renderError() {
+  boxA.innerText = 'Error';
+  boxB.innerText = 'Error';
+}
+
+// Accept MHz (decimal) from user, convert to Hz integer before sending
+async function setFreq(vfo, mhzInput) {
+  try {
+    const mhz = parseFloat(mhzInput);
+    if (!Number.isFinite(mhz)) throw new Error('invalid MHz');
+    // convert MHz to Hz and round to nearest Hz
+    const hz = Math.round(mhz * 1_000_000);
+    const r = await fetch('/set_freq', {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ vfo: vfo, hz: hz })
+    });
+    const j = await r.json();
+    if (!r.ok) throw new Error(j.reason || 'set failed');
+    return true;
+  } catch (e) {
+    console.error(e);
+    return false;
+  }
+}
+
+// Forms submit on Enter as well as on the button
+for (const form of document.querySelectorAll('form[data-vfo]')) {
+  form.addEventListener('submit', async e => {
+    e.preventDefault();
+    const label = form.dataset.label;
+    const v = form.querySelector('input').value;
+    if (!v || String(v).trim() === '') return alert(`Enter MHz for ${label}`);
+    if (await setFreq(form.dataset.vfo, v)) alert(`Set ${label}`);
+  });
+}
+
+if (!!window.EventSource) {
+  const es = new EventSource('/stream');
+  es.onmessage = e => {
+    try {
+      render(JSON.parse(e.data));
+    } catch (err) {
+      renderError();
+    }
+  };
+  es.onerror = e => { renderError(); console.error(e); };
+} else {
+  async function update() {
+    try {
+      const r = await fetch('/freq', {cache: "no-store"});
+      render(await r.json());
+    } catch (e) {
+      renderError();
+    }
+  }
+  // poll faster when EventSource is not available
+  setInterval(update, 200);
+  update();
+}
@@ -0,0 +1,48 @@
+import gzip
+import sys
+
+from YaesuCat.assets import accepted_encodings, load_assets
+
+from test_main_serial import load_main_module, make_fake_rig, prep_fake_serial_module
+
+
+def test_load_assets_fingerprints_and_compresses(tmp_path):
+    (tmp_path / "app.js").write_text("console.log('x');\n" * 50)
+    (tmp_path / "index.html").write_text('<script src="/static/app.js"></script>')
+    assets = load_assets(str(tmp_path))
+
+    js = assets["app.js"]
+    assert js.mimetype in ("text/javascript", "application/javascript")
+    assert f'/static/app.js?v={js.digest}'.encode() in assets["index.html"].variants["identity"][0]
+    coding, body, etag = js.select("gzip, deflate")
+    assert coding == "gzip" and etag == f'"{js.digest}-gz"'
+    assert gzip.decompress(body) == js.variants["identity"][0]
+    assert js.select("gzip;q=0")[0] == "identity"
+    # too small to gain from compression
+    assert "gzip" not in assets["index.html"].variants
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("br;q=1.0, gzip;q=0.5, identity;q=0") == {"br", "gzip"}
+    assert accepted_encodings("") == set()
+
+
+def test_index_served_with_etag_and_revalidation():
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_rig())
+    main = load_main_module()
+    client = main.app.test_client()
+
+    r = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert r.status_code == 200 and r.headers['Cache-Control'] == 'no-cache'
+    assert r.headers['Content-Encoding'] == 'gzip'
+    page = gzip.decompress(r.data).decode()
+    digest = main.assets['app.js'].digest
+    assert f'/static/app.js?v={digest}' in page
+
+    again = client.get('/', headers={'Accept-Encoding': 'gzip', 'If-None-Match': r.headers['ETag']})
+    assert again.status_code == 304 and not again.data
+
+    js = client.get(f'/static/app.js?v={digest}')
+    assert js.status_code == 200 and 'immutable' in js.headers['Cache-Control']
+    assert b'formatHz' in js.data
+    assert client.get('/static/missing.js').status_code == 404
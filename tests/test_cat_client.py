@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+from YaesuCat.client import CatClient, CatError, CatTimeout, frame_mnemonic
+
+
+class ScriptedSerial:
+    """Answers each written command from a canned table (full command, else mnemonic), in write order."""
+
+    def __init__(self, answers):
+        self.is_open = True
+        self.writes = []
+        self._answers = answers
+        self._pending = []
+
+    def write(self, data):
+        self.writes.append(data)
+        for cmd in data.split(b";")[:-1]:
+            ans = self._answers.get(cmd, self._answers.get(cmd[:2]))
+            if ans is not None:
+                self._pending.append(ans)
+
+    def read_until(self, sep=b";"):
+        return self._pending.pop(0) if self._pending else b""
+
+    def reset_input_buffer(self):
+        pass
+
+
+def test_frame_mnemonic():
+    assert frame_mnemonic(b"FA014250000;") == b"FA"
+    assert frame_mnemonic(b"\x10FB007100000;") == b"FB"
+    assert frame_mnemonic(b"?;") == b"?"
+    assert frame_mnemonic(b";") == b""
+
+
+def test_answers_matched_by_mnemonic_out_of_order():
+    # the rig answers FB before FA; each future must still get its own frame
+    s = ScriptedSerial({b"FA": b"FB007100000;", b"FB": b"FA014250000;"})
+    cat = CatClient(lambda: s)
+    fa, fb = cat.query_many([b"FA;", "FB"])
+    assert fa.result(1) == b"FA014250000;"
+    assert fb.result(1) == b"FB007100000;"
+    assert s.writes == [b"FA;FB;"]
+    cat.close()
+
+
+def test_concurrent_callers_share_the_port():
+    s = ScriptedSerial({b"FA": b"FA014250000;", b"ID": b"ID0682;"})
+    lock = threading.Lock()
+    cat = CatClient(lambda: s, lock)
+    results = {}
+
+    def worker(cmd):
+        results[cmd] = cat.query(cmd).result(1)
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in (b"FA;", b"ID;")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {b"FA;": b"FA014250000;", b"ID;": b"ID0682;"}
+    cat.close()
+
+
+def test_timeout_retries_then_fails():
+    s = ScriptedSerial({})
+    cat = CatClient(lambda: s, timeout=0.01, retries=1)
+    with pytest.raises(CatTimeout):
+        cat.query(b"FA;").result(1)
+    assert s.writes == [b"FA;", b"FA;"]
+    cat.close()
+
+
+def test_rejected_command_and_set_command():
+    s = ScriptedSerial({b"ZZ": b"?;"})
+    cat = CatClient(lambda: s)
+    with pytest.raises(CatError):
+        cat.query(b"ZZ;").result(1)
+    assert cat.send(b"FA014250000;").result(1) is None
+    cat.close()
+
+
+def test_rejected_set_fails_the_set_not_the_read_back():
+    s = ScriptedSerial({b"FA999999999": b"?;", b"FA": b"FA014250000;", b"ID": b"ID0682;"})
+    unsolicited = []
+    cat = CatClient(lambda: s, on_unsolicited=unsolicited.append)
+    sent, read = cat.send_then_query(b"FA999999999;", [b"FA;"])
+    with pytest.raises(CatError, match="FA999999999"):
+        sent.result(1)
+    assert read.result(1) == b"FA014250000;"
+    assert unsolicited == []
+    # alone, the set waits out the reject window
+    with pytest.raises(CatError):
+        cat.send(b"FA999999999;").result(1)
+    cat.close()
+
+
+def test_rejected_read_back_is_not_blamed_on_the_set():
+    s = ScriptedSerial({b"AN0": b"?;", b"ID": b"ID0682;"})
+    cat = CatClient(lambda: s)
+    sent, read = cat.send_then_query(b"PC050;", [b"AN0;"])
+    assert sent.result(1) is None
+    with pytest.raises(CatError, match="AN0"):
+        read.result(1)
+    assert s.writes == [b"PC050;ID;AN0;"]
+    cat.close()
@@ -0,0 +1,109 @@
+import time
+
+from YaesuCat.client import CatClient
+from YaesuCat.keyer import CwSender, cw_units, split_cw_text
+
+
+class KeyerRig:
+    """Answers KS/TX reads; records every command written."""
+
+    def __init__(self, on_load=None):
+        self.is_open = True
+        self.commands = []
+        self._out = []
+        self.on_load = on_load
+        self.on_key = None
+
+    def write(self, data):
+        for cmd in data.split(b";")[:-1]:
+            self.commands.append(cmd)
+            if cmd[:2] == b"KM" and self.on_load is not None:
+                self.on_load()
+            if cmd[:2] == b"KY" and self.on_key is not None:
+                on_key, self.on_key = self.on_key, None
+                on_key()
+            if cmd == b"KS":
+                self._out.append(b"KS060;")
+            elif cmd == b"TX":
+                self._out.append(b"TX0;")
+
+    def read_until(self, sep=b";"):
+        return self._out.pop(0) if self._out else b""
+
+    def reset_input_buffer(self):
+        pass
+
+
+def wait_for(pred, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if pred():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_paris_is_fifty_units():
+    assert cw_units("PARIS ") == 50
+
+
+def test_split_cw_text_breaks_at_words():
+    text = "cq test de g4abc g4abc " + "x" * 60 + " k ~"
+    chunks = split_cw_text(text, max_len=20)
+    assert all(len(c) <= 20 for c in chunks)
+    assert chunks[0] == "CQ TEST DE G4ABC "
+    assert "".join(chunks).replace(" ", "") == ("CQTESTDEG4ABCG4ABC" + "X" * 60 + "K")
+    assert split_cw_text("~~~") == []
+
+
+def test_sender_alternates_memories_and_waits_for_rx():
+    rig = KeyerRig()
+    cat = CatClient(lambda: rig)
+    cw = CwSender(cat, channels=(4, 5), max_chars=5)
+    chunks = cw.send("eee eee")
+    assert chunks == ["EEE ", "EEE"]
+    assert wait_for(lambda: b"KY5" in rig.commands and not cw.status()["busy"])
+    sent = [c for c in rig.commands if c[:2] in (b"KM", b"KY")]
+    assert sent == [b"KM4" + chunks[0].encode(), b"KY4", b"KM5" + chunks[1].encode(), b"KY5"]
+    cat.close()
+
+
+def test_abort_drops_queue_and_unkeys():
+    rig = KeyerRig()
+    cat = CatClient(lambda: rig)
+    cw = CwSender(cat)
+    cw.send("PARIS " * 40)
+    assert wait_for(lambda: cw.status()["busy"])
+    assert cw.abort() >= 1
+    assert wait_for(lambda: b"TX0" in rig.commands and not cw.status()["busy"])
+    assert cw.status()["queued"] == 0
+    cat.close()
+
+
+def test_abort_during_load_never_keys():
+    rig = KeyerRig()
+    cat = CatClient(lambda: rig)
+    cw = CwSender(cat)
+    # the operator aborts while the worker is waiting for the first KM load
+    rig.on_load = lambda: (time.sleep(0.05), cw.abort())
+    cw.send("CQ CQ")
+    assert wait_for(lambda: b"TX0" in rig.commands)
+    assert wait_for(lambda: not cw.status()["busy"])
+    # a stray KY would follow TX0 once that set's reject window has passed
+    time.sleep(0.3)
+    assert not [c for c in rig.commands if c[:2] == b"KY"]
+    cat.close()
+
+
+def test_message_sent_right_after_abort_is_keyed():
+    rig = KeyerRig()
+    cat = CatClient(lambda: rig)
+    cw = CwSender(cat)
+    # abort and send new text while the first KY is still going out
+    rig.on_key = lambda: (cw.abort(), cw.send("TEST"))
+    cw.send("EEE")
+    assert wait_for(lambda: any(c.endswith(b"TEST") for c in rig.commands))
+    loaded = next(c for c in rig.commands if c.endswith(b"TEST"))
+    assert wait_for(lambda: b"KY" + loaded[2:3] in rig.commands[rig.commands.index(loaded):])
+    assert wait_for(lambda: not cw.status()["busy"] and cw.status()["queued"] == 0)
+    cat.close()
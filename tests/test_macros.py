@@ -0,0 +1,101 @@
+import json
+import sys
+
+import pytest
+
+from YaesuCat.client import CatClient
+from YaesuCat.macros import MacroError, compile_macro, compile_macros, run_macro
+
+from test_main_serial import load_main_module, prep_fake_serial_module
+
+
+class SettingsRig:
+    """Stores set commands and echoes them back to reads (MD0; -> MD0C;)."""
+
+    def __init__(self, *args, ignore=(), **kwargs):
+        self.is_open = True
+        self.writes = []
+        self.settings = {}
+        self._ignore = ignore
+        self._out = []
+
+    def write(self, data):
+        self.writes.append(data)
+        for cmd in data.split(b";")[:-1]:
+            match = [v for k, v in self.settings.items() if v.startswith(cmd)]
+            if cmd == b"ID":
+                self._out.append(b"ID0682;")
+            elif match and len(cmd) <= 3:
+                self._out.append(match[0] + b";")
+            elif len(cmd) > 3 and cmd[:2] not in self._ignore:
+                key = cmd[:3] if cmd[:2] in (b"MD", b"AN") else cmd[:2]
+                self.settings[key] = cmd
+
+    def read_until(self, sep=b";"):
+        return self._out.pop(0) if self._out else b""
+
+    def reset_input_buffer(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+def test_compile_builds_one_payload_and_read_backs():
+    m = compile_macro("ft8", ["FA014074000", {"FB": 7074000}, "md0c;", {"PC": "050"}, "AN01", "SQ1100"])
+    assert m.payload == b"FA014074000;FB007074000;MD0C;PC050;AN01;SQ1100;"
+    assert compile_macro("data", [{"md": "0c"}]).payload == b"MD0C;"
+    assert [r for r, _ in m.reads] == [b"FA;", b"FB;", b"MD0;", b"PC;", b"AN0;", b"SQ1;"]
+
+
+@pytest.mark.parametrize("steps", [
+    [], ["ZZ1"], ["MD0X"], ["PC300"], ["FA14074000"], [{"FA": 1, "MD": 2}], [42],
+    # out of range
+    ["SQ1999"], ["AG0999"], ["RG0256"], [{"FA": 10000}], ["FB080000000"],
+    # no known set layout: read-only, transmit or unlisted
+    ["IF"], ["ID"], ["TX1"], ["BI1"],
+])
+def test_compile_rejects_bad_steps(steps):
+    with pytest.raises(MacroError):
+        compile_macro("bad", steps)
+
+
+def test_compile_macros_skip_invalid():
+    source = {"ok": ["MD02"], "bad": ["IF"]}
+    with pytest.raises(MacroError):
+        compile_macros(source)
+    assert list(compile_macros(source, skip_invalid=True)) == ["ok"]
+
+
+def test_run_macro_single_write_and_confirm():
+    rig = SettingsRig()
+    cat = CatClient(lambda: rig)
+    m = compile_macro("ft8", ["FA014074000", "MD0C", "PC050"])
+    result = run_macro(cat, m, confirm=True)
+    assert result["confirmed"] is True and result["mismatches"] == []
+    assert rig.writes == [b"FA014074000;MD0C;PC050;ID;FA;MD0;PC;"]
+    cat.close()
+
+
+def test_run_macro_reports_mismatch():
+    rig = SettingsRig(ignore=(b"PC",))
+    rig.settings[b"PC"] = b"PC100"
+    cat = CatClient(lambda: rig)
+    result = run_macro(cat, compile_macro("low", ["MD02", "PC005"]), confirm=True)
+    assert result["confirmed"] is False
+    assert result["mismatches"] == [{"read": "PC;", "expected": "PC005", "answer": "PC100;"}]
+    cat.close()
+
+
+def test_macro_endpoints(tmp_path, monkeypatch):
+    path = tmp_path / "macros.json"
+    path.write_text(json.dumps({"ssb": [{"FA": 14250000}, "MD02"], "broken": ["MD0X"]}))
+    monkeypatch.setenv("YAESU_MACROS", str(path))
+    sys.modules['serial'] = prep_fake_serial_module(SettingsRig)
+    main = load_main_module()
+    client = main.app.test_client()
+
+    assert client.get('/macro').get_json()['macros'] == {"ssb": ["FA014250000;", "MD02;"]}
+    assert client.post('/macro/broken').status_code == 404
+    r = client.post('/macro/ssb', json={"confirm": True})
+    assert r.status_code == 200 and r.get_json()['confirmed'] is True
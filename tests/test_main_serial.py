@@ -37,6 +37,41 @@ def make_fake_serial(responses=None):
     return FakeSerial
 
 
+def make_fake_rig(initial=None, accept_sets=True):
+    """Fake serial that behaves like the rig: remembers FA/FB and answers reads."""
+    class FakeRig:
+        def __init__(self, *args, **kwargs):
+            self.is_open = True
+            self.writes = []
+            self.vfo = dict(initial or {'FA': 14074000, 'FB': 7074000})
+            self._out = []
+
+        def write(self, data):
+            self.writes.append(data)
+            for cmd in data.split(b';')[:-1]:
+                name = cmd[:2].decode()
+                if name == 'ID':
+                    self._out.append(b'ID0682;')
+                elif len(cmd) > 2 and accept_sets:
+                    self.vfo[name] = int(cmd[2:])
+                elif len(cmd) == 2:
+                    self._out.append(f"{name}{self.vfo[name]:09d};".encode())
+
+        def read_until(self, sep=b";"):
+            return self._out.pop(0) if self._out else b""
+
+        def readline(self):
+            return self.read_until()
+
+        def reset_input_buffer(self):
+            pass
+
+        def close(self):
+            self.is_open = False
+
+    return FakeRig
+
+
 def prep_fake_serial_module(fake_class):
     mod = types.ModuleType("serial")
     mod.Serial = fake_class
@@ -59,8 +94,8 @@ def load_main_module():
 
 
 def test_set_freq_writes_command(tmp_path, monkeypatch):
-    # fake serial will capture writes
-    FakeSerial = make_fake_serial(responses=[])
+    # fake rig will capture writes and answer the read-back
+    FakeSerial = make_fake_rig()
     fake_mod = prep_fake_serial_module(FakeSerial)
     sys.modules['serial'] = fake_mod
 
@@ -73,7 +108,37 @@ def test_set_freq_writes_command(tmp_path, monkeypatch):
     assert resp.status_code == 200
     # main.ser should be instance of our FakeSerial
     assert hasattr(main, 'ser') and main.ser is not None
-    assert main.ser.writes[-1] == b'FA014250000;'
+    # the CAT client may coalesce the set with queued poll queries into one write
+    assert b'FA014250000;' in b''.join(main.ser.writes)
+    j = resp.get_json()
+    assert j['confirmed'] is True and j['hz'] == 14250000
+    assert j['confirm_ms'] >= 0
+
+
+def test_set_freq_rejects_out_of_range_hz():
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_rig())
+    main = load_main_module()
+    client = main.app.test_client()
+    for hz in (-5, 10**10, True, 29999, 75000001, "abc"):
+        r = client.post('/set_freq', json={'vfo': 'FA', 'hz': hz})
+        assert r.status_code == 400, hz
+    # nothing was shown as pending or sent to the rig
+    assert client.get('/freq').get_json()['pending'] is False
+    writes = main.ser.writes if main.ser is not None else []
+    assert all(len(c) <= 2 for w in writes for c in w.split(b';'))
+
+
+def test_set_freq_rolls_back_when_rig_disagrees():
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_rig(accept_sets=False))
+    main = load_main_module()
+    client = main.app.test_client()
+
+    resp = client.post('/set_freq', json={'vfo': 'FB', 'hz': 7100000})
+    assert resp.status_code == 409
+    assert resp.get_json()['hz'] == 7074000
+    j = client.get('/freq').get_json()
+    assert j['hz_b'] == 7074000
+    assert j['pending_b'] is False
 
 
 def test_poll_updates_freq_and_freq_endpoint(monkeypatch):
@@ -93,5 +158,43 @@ def test_poll_updates_freq_and_freq_endpoint(monkeypatch):
     r = client.get('/freq')
     assert r.status_code == 200
     j = r.get_json()
-    assert j['frequency'] == '14.25000 MHz'
-    assert j['frequency_b'] == '7.10000 MHz'
+    assert j['hz'] == 14250000
+    assert j['hz_b'] == 7100000
+
+
+def test_info_poll_mode_fills_both_receivers(monkeypatch):
+    monkeypatch.setenv('YAESU_POLL_MODE', 'info')
+    responses = [b'IF001014250000+000000200000;', b'OI001007100000-012010100000;']
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_serial(responses=responses))
+    main = load_main_module()
+    time.sleep(0.1)
+
+    assert main.ser.writes[0] == b'IF;OI;'
+    j = main.app.test_client().get('/freq').get_json()
+    assert j['hz'] == 14250000
+    assert j['hz_b'] == 7100000
+    assert j['info']['mode'] == 'USB'
+    assert j['info_b']['mode'] == 'LSB' and j['info_b']['clar_offset'] == -120
+
+
+def test_dual_port_sends_writes_on_control_port(monkeypatch):
+    monkeypatch.setenv('YAESU_CTRL_PORT', 'COM22')
+    FakeRig = make_fake_rig()
+    opened = {}
+
+    class PortRecorder(FakeRig):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            opened[kwargs['port']] = self
+
+    sys.modules['serial'] = prep_fake_serial_module(PortRecorder)
+    main = load_main_module()
+    client = main.app.test_client()
+
+    resp = client.post('/set_freq', json={'vfo': 'FA', 'hz': 14250000})
+    assert resp.status_code == 200 and resp.get_json()['confirmed'] is True
+    assert set(opened) == {'COM21', 'COM22'}
+    ctrl = b''.join(opened['COM22'].writes)
+    assert ctrl == b'FA014250000;ID;FA;'
+    # the polling port only ever sees reads
+    assert b'FA014250000;' not in b''.join(opened['COM21'].writes)
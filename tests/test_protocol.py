@@ -0,0 +1,34 @@
+import pytest
+
+from YaesuCat import protocol
+
+
+def test_build_command():
+    assert protocol.build_command("MD", "02") == b"MD02;"
+    assert protocol.build_command("ID") == b"ID;"
+    with pytest.raises(ValueError):
+        protocol.build_command("ZZ")
+    with pytest.raises(ValueError):
+        protocol.build_command("KM", "1CQ;TX1")
+
+
+def test_parse_info_response():
+    info = protocol.parse_info_response(b"IF001014250000+000000200000;")
+    assert info["band"] == "main"
+    assert info["hz"] == 14250000
+    assert info["mode"] == "USB"
+    assert info["channel_mode"] == "VFO"
+    assert info["rx_clar"] is False
+
+    sub = protocol.parse_info_response(b"OI0P1007100000-012010C10001;")
+    assert sub["band"] == "sub"
+    assert sub["memory_channel"] == "0P1"
+    assert sub["hz"] == 7100000
+    assert sub["clar_offset"] == -120
+    assert sub["rx_clar"] is True and sub["tx_clar"] is False
+    assert sub["mode"] == "DATA-U"
+    assert sub["channel_mode"] == "Memory"
+    assert sub["shift"] == "Plus"
+
+    with pytest.raises(ValueError):
+        protocol.parse_info_response(b"FA014250000;")
@@ -0,0 +1,212 @@
+import sys
+import time
+import uuid
+
+import pytest
+
+from YaesuCat.shared_state import CommandClient, SharedRigState, SharedStateError, serve_commands
+
+from test_main_serial import load_main_module, make_fake_serial, prep_fake_serial_module
+
+
+def test_publish_and_read_across_handles():
+    name = f"ytest_{uuid.uuid4().hex[:8]}"
+    writer = SharedRigState.create(name, size=256)
+    reader = SharedRigState.attach(name)
+    try:
+        assert reader.read() == (0, {})
+        writer.publish({"hz": 14250000, "pending": True})
+        writer.publish({"hz": 7100000, "pending": False})
+        assert reader.version() == 2
+        assert reader.read() == (2, {"hz": 7100000, "pending": False})
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_publish_rejects_oversized_state():
+    name = f"ytest_{uuid.uuid4().hex[:8]}"
+    writer = SharedRigState.create(name, size=32)
+    try:
+        try:
+            writer.publish({"error": "x" * 64})
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("expected ValueError")
+    finally:
+        writer.close()
+
+
+def test_reader_notices_restarted_writer():
+    name = f"ytest_{uuid.uuid4().hex[:8]}"
+    writer = SharedRigState.create(name, size=256)
+    reader = SharedRigState.attach(name)
+    try:
+        writer.publish({"hz": 1})
+        assert not reader.stale()
+        writer.close()
+        assert reader.stale()
+        writer = SharedRigState.create(name, size=256)
+        writer.publish({"hz": 2})
+        writer.publish({"hz": 3})
+        reader.close()
+        reader = SharedRigState.attach(name)
+        assert reader.read() == (2, {"hz": 3})
+        # a writer that died without closing is taken over in place; readers still see the change
+        SharedRigState.create(name, size=256)
+        assert reader.stale()
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_read_gives_up_on_a_torn_publish():
+    name = f"ytest_{uuid.uuid4().hex[:8]}"
+    writer = SharedRigState.create(name, size=256)
+    reader = SharedRigState.attach(name)
+    try:
+        # writer died between the two sequence bumps
+        writer._buf[0] = 1
+        with pytest.raises(SharedStateError):
+            reader.read(timeout=0.01)
+    finally:
+        reader.close()
+        writer.close()
+
+
+def test_command_round_trip():
+    listener = serve_commands(("127.0.0.1", 0), b"k", lambda name, kw: {"name": name, **kw})
+    client = CommandClient(listener.address, b"k")
+    try:
+        assert client.call("set_freq", hz=1) == {"name": "set_freq", "hz": 1}
+        assert client.call("noop") == {"name": "noop"}
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_command_not_resent_when_the_reply_is_lost():
+    calls = []
+
+    def handler(name, kwargs):
+        calls.append(name)
+        return {"body": {}, "code": 200}
+
+    listener = serve_commands(("127.0.0.1", 0), b"k", handler)
+    client = CommandClient(listener.address, b"k")
+    try:
+        client.call("noop")
+
+        class LostReply:
+            """The request goes out, then the connection drops before the reply."""
+
+            def __init__(self, conn):
+                self._conn = conn
+
+            def send(self, obj):
+                self._conn.send(obj)
+
+            def recv(self):
+                raise EOFError
+
+            def close(self):
+                self._conn.close()
+
+        client._conn = LostReply(client._conn)
+        with pytest.raises(EOFError):
+            client.call("cw_send")
+        deadline = time.monotonic() + 1.0
+        while "cw_send" not in calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert calls == ["noop", "cw_send"]
+        # the next call reconnects
+        client.call("noop")
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_failing_handler_replies_with_body_and_code():
+    def handler(name, kwargs):
+        raise RuntimeError("boom")
+
+    listener = serve_commands(("127.0.0.1", 0), b"k", handler)
+    client = CommandClient(listener.address, b"k")
+    try:
+        assert client.call("noop") == {"body": {"status": "error", "reason": "boom"}, "code": 500}
+    finally:
+        client.close()
+        listener.close()
+
+
+def test_forwarded_commands_reject_non_object_data(monkeypatch):
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_serial())
+    main = load_main_module()
+    for name in ("set_freq", "cw_send", "macro_run"):
+        assert main._handle_command(name, {"data": [1, 2]})["code"] == 400
+
+    def broken(_data):
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(main._RIG_COMMANDS, "cw_status", broken)
+    assert main._handle_command("cw_status", {"data": None}) == {
+        "body": {"status": "error", "reason": "boom"}, "code": 500}
+
+
+def test_web_role_reads_shared_state_and_forwards_writes(monkeypatch):
+    name = f"ytest_{uuid.uuid4().hex[:8]}"
+    io_state = SharedRigState.create(name)
+    forwarded = []
+
+    def handler(cmd, kwargs):
+        forwarded.append((cmd, kwargs))
+        return {"body": {"status": "ok"}, "code": 200}
+
+    listener = serve_commands(("127.0.0.1", 0), b"k", handler)
+    monkeypatch.setenv("YAESU_ROLE", "web")
+    monkeypatch.setenv("YAESU_SHM_NAME", name)
+    monkeypatch.setenv("YAESU_CMD_PORT", str(listener.address[1]))
+    monkeypatch.setenv("YAESU_CMD_AUTHKEY", "k")
+    FakeSerial = make_fake_serial()
+    sys.modules['serial'] = prep_fake_serial_module(FakeSerial)
+    main = None
+    try:
+        main = load_main_module()
+        client = main.app.test_client()
+        io_state.publish({"hz": 14250000, "hz_b": 7100000, "error": None, "error_b": None,
+                          "pending": False, "pending_b": False})
+        assert client.get('/freq').get_json()['hz'] == 14250000
+
+        # io process restarted: the web worker must follow it to the new segment
+        main.SHM_RECHECK = 0
+        io_state.close()
+        io_state = SharedRigState.create(name)
+        io_state.publish({"hz": 7000000, "hz_b": None, "error": None, "error_b": None,
+                          "pending": False, "pending_b": False})
+        assert client.get('/freq').get_json()['hz'] == 7000000
+        io_state.close()
+        down = client.get('/freq').get_json()
+        assert down['error'] == 'I/O process not running'
+        assert set(down) == set(main._state_payload_locked())
+
+        r = client.post('/set_freq', json={'vfo': 'FA', 'hz': 14250000})
+        assert r.status_code == 200
+        assert forwarded == [("set_freq", {"data": {"vfo": "FA", "hz": 14250000}})]
+        # a web worker never touches the serial port
+        assert main.ser is None
+    finally:
+        listener.close()
+        if main is not None and main.shared_state is not None:
+            main.shared_state.close()
+        io_state.close()
+
+
+def test_io_and_web_roles_require_an_authkey(monkeypatch):
+    monkeypatch.delenv("YAESU_CMD_AUTHKEY", raising=False)
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_serial())
+    for role in ("io", "web"):
+        monkeypatch.setenv("YAESU_ROLE", role)
+        with pytest.raises(RuntimeError, match="YAESU_CMD_AUTHKEY"):
+            load_main_module()
@@ -0,0 +1,62 @@
+import sys
+import time
+
+from YaesuCat.client import CatClient
+from YaesuCat.tracing import Tracer, span
+
+from test_main_serial import load_main_module, make_fake_rig, prep_fake_serial_module
+
+
+class OneShotRig:
+    def __init__(self):
+        self.is_open = True
+        self._out = []
+
+    def write(self, data):
+        self._out.append(b"FA014250000;")
+
+    def read_until(self, sep=b";"):
+        return self._out.pop(0) if self._out else b""
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(sample_rate=0.0)
+    trace = tracer.start("poll")
+    assert trace is None
+    with span(trace, "anything"):
+        pass
+    tracer.finish(trace)
+    assert tracer.chrome_trace()["traceEvents"] == []
+
+
+def test_cat_client_spans_in_chrome_format():
+    tracer = Tracer(sample_rate=1.0)
+    cat = CatClient(lambda: OneShotRig())
+    trace = tracer.start("poll")
+    assert cat.query(b"FA;", trace=trace).result(1) == b"FA014250000;"
+    with span(trace, "parse"):
+        pass
+    tracer.finish(trace)
+    cat.close()
+
+    events = tracer.chrome_trace()["traceEvents"]
+    names = [e["name"] for e in events]
+    assert names[0] == "poll"
+    for stage in ("cat.queue", "serial_lock.wait", "serial.write", "rig.turnaround", "parse"):
+        assert stage in names
+    assert all(e["ph"] == "X" and e["dur"] >= 0 and e["tid"] == trace.id for e in events)
+
+
+def test_debug_trace_endpoint():
+    sys.modules['serial'] = prep_fake_serial_module(make_fake_rig())
+    main = load_main_module()
+    client = main.app.test_client()
+    assert client.post('/debug/trace', json={'sample_rate': 2}).status_code == 400
+    assert client.post('/debug/trace', json={'sample_rate': 1}).get_json()['sample_rate'] == 1.0
+    names = set()
+    deadline = time.monotonic() + 2.0
+    while 'poll' not in names and time.monotonic() < deadline:
+        time.sleep(0.02)
+        names = {e['name'] for e in client.get('/debug/trace').get_json()['traceEvents']}
+    client.post('/debug/trace', json={'sample_rate': 0})
+    assert {'poll', 'serial.write', '_parse_hz_resp'} <= names